@@ -0,0 +1,31 @@
+import pytest
+
+from core.testing import temporary_runtime_files
+
+
+@pytest.fixture(autouse=True, scope='session')
+def runtime_files():
+    """Служебные файлы приложения — во временном каталоге."""
+    with temporary_runtime_files():
+        yield
+
+
+@pytest.fixture(autouse=True)
+def page_cache():
+    """Пустой кэш страниц в каждом тесте.
+
+    База после теста откатывается, а поколения кэша сбрасываются только
+    после фиксации транзакции (posts.signals), поэтому страницы,
+    закэшированные прошлым тестом, иначе оставались бы действительными.
+    """
+    from django.core.cache import cache
+    cache.clear()
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_runtest_teardown(item):
+    """Миниатюры, которые ещё делает пул, дописываются до удаления
+    MEDIA_ROOT теста: сохранивший пост запрос их не ждёт.
+    """
+    from posts import thumbnails
+    thumbnails.shutdown()
@@ -0,0 +1,181 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.db import close_old_connections
+from django.db import connections
+from django.db import OperationalError
+from django.test import Client
+from django.test import override_settings
+from django.urls import reverse
+
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+# Название: (прагмы, CONN_MAX_AGE); None — как в настройках проекта.
+# Режим журнала хранится в самом файле и ставится на копию заранее:
+# сменить его, пока открыты другие соединения, нельзя.
+CASES = {
+    'Django по умолчанию (журнал DELETE, соединение на запрос)': ({}, 0),
+    'SQLITE_PRAGMAS и CONN_MAX_AGE': (None, None),
+}
+SAMPLE = 50
+
+
+def percentile(values, share):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+def run_worker(username, urls, post_ids, authors, seconds, write_share,
+               seed):
+    """Один процесс сервера: смесь чтений и записей в течение seconds."""
+    rng = random.Random(seed)
+    client = Client()
+    client.force_login(User.objects.get(username=username))
+    followed = set()
+    result = {'read': [], 'write': [], 'locked': 0}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        # Мерим базу, а не кэш страниц.
+        cache.clear()
+        kind = 'write' if rng.random() < write_share else 'read'
+        started = time.perf_counter()
+        try:
+            if kind == 'read':
+                client.get(rng.choice(urls))
+            elif rng.random() < 0.5:
+                client.post(
+                    reverse('posts:add_comment', args=[rng.choice(post_ids)]),
+                    {'text': f'bench {rng.random()}'})
+            else:
+                author = rng.choice(authors)
+                name = ('profile_unfollow' if author in followed
+                        else 'profile_follow')
+                client.get(reverse(f'posts:{name}', args=[author]))
+                followed ^= {author}
+        except OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            result['locked'] += 1
+            continue
+        finally:
+            # Тестовый клиент не шлёт request_finished с закрытием
+            # соединений, а WSGI-обработчик шлёт.
+            close_old_connections()
+        result[kind].append(time.perf_counter() - started)
+    connections.close_all()
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Нагружает копию базы несколькими процессами (ленты, комментарии, '
+            'подписки) без профиля SQLite и с профилем SQLITE_PRAGMAS.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument(
+            '--write-share', type=float, default=0.1,
+            help='Доля запросов на запись'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        database = connections['default'].settings_dict
+        if connections['default'].vendor != 'sqlite':
+            raise CommandError('Нужна база SQLite')
+        plan = self.make_plan(options)
+        original = database['NAME'], database.get('CONN_MAX_AGE', 0)
+        connections.close_all()
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            for number, (name, (pragmas, max_age)) in enumerate(
+                    CASES.items()):
+                if pragmas is None:
+                    pragmas = settings.SQLITE_PRAGMAS
+                path = os.path.join(directory, f'case{number}.sqlite3')
+                self.copy(original[0], path,
+                          pragmas.get('journal_mode', 'DELETE'))
+                database['NAME'] = path
+                database['CONN_MAX_AGE'] = (
+                    original[1] if max_age is None else max_age)
+                try:
+                    with override_settings(
+                            SQLITE_PRAGMAS=pragmas,
+                            DEBUG=False, METRICS_ENABLED=False,
+                            PERFORMANCE_SAMPLE_RATE=0, SLOW_QUERY_MS=None):
+                        results[name] = self.run_case(plan, options)
+                finally:
+                    connections.close_all()
+                    database['NAME'], database['CONN_MAX_AGE'] = original
+        self.report(results, options)
+
+    def make_plan(self, options):
+        """Пользователи и адреса, по которым ходят процессы."""
+        rng = random.Random(options['seed'])
+        usernames = list(User.objects.order_by('?').values_list(
+            'username', flat=True)[:options['workers'] + SAMPLE])
+        post_ids = list(Post.objects.order_by('?').values_list(
+            'pk', flat=True)[:SAMPLE])
+        if len(usernames) < options['workers'] + 1 or not post_ids:
+            raise CommandError('В базе мало данных: manage.py yatube_seed')
+        slugs = Group.objects.values_list('slug', flat=True)[:SAMPLE]
+        authors = usernames[options['workers']:]
+        urls = [reverse('posts:index') + f'?page={page}'
+                for page in range(1, 6)]
+        urls += [reverse('posts:follow_index')] * 5
+        urls += [reverse('posts:group_posts', args=[slug]) for slug in slugs]
+        urls += [reverse('posts:profile', args=[author])
+                 for author in authors]
+        urls += [reverse('posts:post_detail', args=[pk]) for pk in post_ids]
+        return [
+            (username, urls, post_ids, authors, options['seconds'],
+             options['write_share'], rng.random())
+            for username in usernames[:options['workers']]
+        ]
+
+    def copy(self, source, target, journal_mode):
+        """Копия через backup API: вместе с незакрытым WAL."""
+        source_db = sqlite3.connect(source)
+        target_db = sqlite3.connect(target)
+        source_db.backup(target_db)
+        target_db.execute(f'PRAGMA journal_mode = {journal_mode}')
+        target_db.close()
+        source_db.close()
+
+    def run_case(self, plan, options):
+        context = multiprocessing.get_context('fork')
+        with context.Pool(options['workers']) as pool:
+            return pool.starmap(run_worker, plan)
+
+    def report(self, results, options):
+        self.stdout.write(
+            f'Процессов: {options["workers"]}, {options["seconds"]:g} с, '
+            f'доля записи {options["write_share"]:g}')
+        for name, workers in results.items():
+            reads = [value for worker in workers for value in worker['read']]
+            writes = [value for worker in workers
+                      for value in worker['write']]
+            locked = sum(worker['locked'] for worker in workers)
+            seconds = options['seconds']
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(
+                f'  всего {(len(reads) + len(writes)) / seconds:.0f} '
+                f'запросов/с, «database is locked»: {locked}')
+            for label, values in (('чтение', reads), ('запись', writes)):
+                self.stdout.write(
+                    f'  {label}: {len(values) / seconds:.0f}/с, '
+                    f'p50 {percentile(values, 0.5) * 1000:.1f} мс, '
+                    f'p95 {percentile(values, 0.95) * 1000:.1f} мс, '
+                    f'max {max(values, default=0) * 1000:.1f} мс')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from core import slowqueries
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов: отпечатки SQL с наибольшим '
+            'суммарным временем и план самого долгого запроса.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Очистить журнал после вывода сводки'
+        )
+
+    def handle(self, *args, **options):
+        rows = slowqueries.summary(options['limit'])
+        if not rows:
+            self.stdout.write('Медленных запросов нет')
+        for (key, count, total, worst, views, normalized,
+             sql, plan) in rows:
+            self.stdout.write(self.style.WARNING(
+                f'{key}: всего {total * 1000:.1f} мс, запросов {count}, '
+                f'в среднем {total / count * 1000:.1f} мс, '
+                f'максимум {worst * 1000:.1f} мс'))
+            self.stdout.write(f'  URL: {views}')
+            self.stdout.write(f'  {normalized}')
+            if plan:
+                self.stdout.write('  План самого долгого:')
+                for line in plan.splitlines():
+                    self.stdout.write(f'    {line}')
+        if options['clear']:
+            slowqueries.clear()
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from core import replicas
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в реплики DATABASE_REPLICAS '
+            '(локальная замена репликации).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--every', type=float,
+            help='Повторять каждые N секунд, пока команду не остановят'
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('DATABASE_REPLICAS пуст')
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                started = time.perf_counter()
+                replicas.sync(alias)
+                self.stdout.write(f'{alias}: скопирована за '
+                                  f'{time.perf_counter() - started:.2f} с')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
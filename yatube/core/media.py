@@ -0,0 +1,134 @@
+"""Отдача файлов из MEDIA_ROOT без static() и DEBUG.
+
+Файл отдаётся потоком (FileResponse) и не читается в память целиком.
+Поддерживаются условные запросы (ETag, If-Modified-Since, If-None-Match)
+и одиночный диапазон Range/If-Range — браузеры пользуются им для
+докачки и видео. Если перед Django стоит nginx или Apache, настройка
+MEDIA_SENDFILE передаёт саму отдачу им через X-Accel-Redirect или
+X-Sendfile: процесс Django только проверяет путь и валидаторы.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse
+from django.http import Http404
+from django.http import HttpResponse
+from django.http import StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.http import parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def make_etag(stat_result):
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+def parse_range(header, size):
+    """Возвращает (start, end) включительно, 'unsatisfiable' или None.
+
+    None означает, что заголовок не поддерживается (например, несколько
+    диапазонов) и нужно отдать файл целиком.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # bytes=-N — последние N байт.
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return 'unsatisfiable'
+    return start, end
+
+
+def if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    modified = parse_http_date_safe(value)
+    return modified is not None and int(mtime) <= modified
+
+
+def read_range(path, start, end):
+    with open(path, 'rb') as file:
+        file.seek(start)
+        left = end - start + 1
+        while left > 0:
+            chunk = file.read(min(CHUNK_SIZE, left))
+            if not chunk:
+                break
+            left -= len(chunk)
+            yield chunk
+
+
+def sendfile_response(path, relative_path, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = (
+            settings.MEDIA_ACCEL_REDIRECT_PREFIX + relative_path)
+    else:
+        response['X-Sendfile'] = path
+    return response
+
+
+def serve(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stat_result = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError, ValueError):
+        raise Http404('Файл не найден')
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise Http404('Файл не найден')
+    etag = make_etag(stat_result)
+    mtime = stat_result.st_mtime
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(mtime))
+    if response is not None:
+        return response
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    size = stat_result.st_size
+    if settings.MEDIA_SENDFILE:
+        # Range и отдачу тела выполнит фронтовой сервер.
+        response = sendfile_response(
+            full_path, path.lstrip('/'), content_type)
+    else:
+        byte_range = None
+        if 'HTTP_RANGE' in request.META and if_range_matches(
+                request, etag, mtime):
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+        if byte_range == 'unsatisfiable':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+        if byte_range is None:
+            response = FileResponse(open(full_path, 'rb'),
+                                    content_type=content_type)
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                read_range(full_path, start, end),
+                status=206, content_type=content_type)
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    return response
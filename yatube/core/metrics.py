@@ -0,0 +1,206 @@
+"""Метрики запросов в текстовом формате Prometheus (/metrics).
+
+Для каждого имени URL (posts:index, posts:profile, ...) считаются
+запросы, гистограммы времени ответа, числа и времени SQL-запросов и
+попадания/промахи кэша. Данные приходят из core.performance.Recorder.
+По операциям записи (core.writes) — повторы, ожидание блокировки SQLite
+и отказы.
+
+Процессы gunicorn копят приращения у себя и раз в FLUSH_INTERVAL
+секунд добавляют их в общий файл SQLite (METRICS_PATH) одним
+UPSERT'ом на серию; /metrics суммирует файл, поэтому ответ один и тот
+же, какой бы процесс его ни отдал. Счётчики в файле только растут,
+как и положено счётчикам Prometheus; при сбросе файла Prometheus
+увидит обнуление, как при перезапуске. /metrics отдаётся только
+с токеном METRICS_TOKEN (bearer_token в настройках Prometheus).
+"""
+import atexit
+import hmac
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.http import HttpResponseForbidden
+
+from posts.localdb import LocalDatabase
+
+SCHEMA = ('CREATE TABLE IF NOT EXISTS samples ('
+          'name TEXT NOT NULL, labels TEXT NOT NULL, value REAL NOT NULL, '
+          'PRIMARY KEY (name, labels)) WITHOUT ROWID')
+UPSERT_SQL = ('INSERT INTO samples (name, labels, value) VALUES (?, ?, ?) '
+              'ON CONFLICT (name, labels) '
+              'DO UPDATE SET value = value + excluded.value')
+FLUSH_INTERVAL = 1
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNRESOLVED = '<unresolved>'
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+# Имя: (тип, описание).
+FAMILIES = {
+    'yatube_requests_total': (
+        'counter', 'Запросы по имени URL, методу и статусу'),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа по имени URL'),
+    'yatube_db_queries': (
+        'histogram', 'SQL-запросов на один HTTP-запрос'),
+    'yatube_db_duration_seconds': (
+        'histogram', 'Время SQL-запросов за один HTTP-запрос'),
+    'yatube_cache_hits_total': (
+        'counter', 'Попадания в кэш по имени URL'),
+    'yatube_cache_misses_total': (
+        'counter', 'Промахи кэша по имени URL'),
+    'yatube_db_write_retries_total': (
+        'counter', 'Повторы BEGIN IMMEDIATE по операции записи'),
+    'yatube_db_lock_wait_seconds': (
+        'histogram', 'Ожидание блокировки SQLite на запись'),
+    'yatube_db_write_failures_total': (
+        'counter', 'Записи, не дождавшиеся блокировки'),
+}
+SUFFIXES = ('_bucket', '_sum', '_count')
+LE_RE = re.compile(r',?le="([^"]+)"')
+
+store = LocalDatabase(lambda: settings.METRICS_PATH, SCHEMA)
+
+_pending = defaultdict(float)
+_lock = threading.Lock()
+_flushed = time.monotonic()
+
+
+def format_labels(labels):
+    items = ','.join(
+        f'{key}="{escape(value)}"' for key, value in labels.items())
+    return '{' + items + '}'
+
+
+def escape(value):
+    return (str(value).replace('\\', r'\\')
+            .replace('"', r'\"').replace('\n', r'\n'))
+
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def inc(name, labels, value=1):
+    _pending[name, format_labels(labels)] += value
+
+
+def observe(name, labels, value, buckets):
+    for bound in buckets:
+        # Нулевые приращения тоже пишутся: корзины не должны пропадать.
+        inc(f'{name}_bucket', {**labels, 'le': format_value(bound)},
+            value <= bound)
+    inc(f'{name}_bucket', {**labels, 'le': '+Inf'})
+    inc(f'{name}_sum', labels, value)
+    inc(f'{name}_count', labels)
+
+
+def record(request, response, recorder):
+    """Учитывает завершённый запрос."""
+    match = request.resolver_match
+    view = {'view': match.view_name if match else UNRESOLVED}
+    with _lock:
+        inc('yatube_requests_total', {
+            **view, 'method': request.method,
+            'status': response.status_code})
+        observe('yatube_request_duration_seconds', view, recorder.total,
+                SECONDS_BUCKETS)
+        observe('yatube_db_queries', view, recorder.sql_count,
+                QUERY_BUCKETS)
+        observe('yatube_db_duration_seconds', view, recorder.sql_time,
+                SECONDS_BUCKETS)
+        inc('yatube_cache_hits_total', view, recorder.cache_hits)
+        inc('yatube_cache_misses_total', view, recorder.cache_misses)
+    if time.monotonic() - _flushed >= FLUSH_INTERVAL:
+        flush()
+
+
+def record_write(operation, retries, lock_wait, failed=False):
+    """Учитывает попытку взять блокировку на запись (core.writes)."""
+    if not settings.METRICS_ENABLED:
+        return
+    labels = {'operation': operation}
+    with _lock:
+        inc('yatube_db_write_retries_total', labels, retries)
+        observe('yatube_db_lock_wait_seconds', labels, lock_wait,
+                SECONDS_BUCKETS)
+        inc('yatube_db_write_failures_total', labels, failed)
+
+
+def flush():
+    """Переносит накопленные приращения в общий файл."""
+    global _flushed
+    with _lock:
+        rows = [(name, labels, value)
+                for (name, labels), value in _pending.items()]
+        _pending.clear()
+        _flushed = time.monotonic()
+    if not rows:
+        return
+    connection = store.connection
+    with connection:
+        connection.execute('BEGIN IMMEDIATE')
+        connection.executemany(UPSERT_SQL, rows)
+
+
+atexit.register(flush)
+
+
+def family(name):
+    if name in FAMILIES:
+        return name
+    for suffix in SUFFIXES:
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def sort_key(row):
+    """Порядок вывода: серии семейства вместе, корзины по возрастанию."""
+    name, labels, _ = row
+    base = family(name)
+    suffix = name[len(base):]
+    match = LE_RE.search(labels)
+    return (base, LE_RE.sub('', labels),
+            SUFFIXES.index(suffix) if suffix else 0,
+            float(match.group(1)) if match else 0)
+
+
+def render():
+    """Все серии из общего файла в текстовом формате Prometheus."""
+    flush()
+    rows = sorted(store.execute('SELECT name, labels, value FROM samples'),
+                  key=sort_key)
+    lines = []
+    current = None
+    for name, labels, value in rows:
+        if family(name) != current:
+            current = family(name)
+            kind, help_text = FAMILIES.get(current, ('untyped', ''))
+            lines.append(f'# HELP {current} {help_text}')
+            lines.append(f'# TYPE {current} {kind}')
+        lines.append(f'{name}{labels} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(request):
+    """Запрос несёт заголовок Authorization: Bearer METRICS_TOKEN.
+
+    Адрес клиента не проверяется: за локальным nginx у всех запросов
+    REMOTE_ADDR — 127.0.0.1. Без METRICS_TOKEN метрики не отдаются.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+def metrics_view(request):
+    if not authorized(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,198 @@
+"""Замеры времени запроса: SQL, кэш, шаблоны и весь запрос.
+
+PerformanceMiddleware для доли запросов PERFORMANCE_SAMPLE_RATE
+собирает Recorder: число и время SQL-запросов (execute_wrapper на всех
+соединениях), попадания и промахи кэша (get/get_many экземпляров кэша
+текущего потока — Django создаёт их отдельно для каждого потока),
+время отрисовки шаблонов (шаблонный backend DjangoTemplates ниже) и
+общее время. Результат уходит в заголовок Server-Timing и в строку
+журнала core.performance. Для остальных запросов не делается ничего,
+кроме одной проверки ContextVar при отрисовке шаблона, — если не
+включены метрики (METRICS_ENABLED): тогда замеряется каждый запрос и
+попадает в core.metrics, а заголовок и журнал — по-прежнему выборка.
+"""
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template import TemplateDoesNotExist
+from django.template.backends import django as django_backend
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+current = ContextVar('performance_recorder', default=None)
+
+
+class Recorder:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = 0.0
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_time = 0.0
+        # Вложенные вызовы (include, get внутри get_many) не считаются.
+        self.template_depth = 0
+        self.cache_depth = 0
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join((
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.sql_count} queries"',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total * 1000:.1f}',
+        ))
+
+    def fields(self):
+        return {
+            'total_ms': round(self.total * 1000, 1),
+            'sql_count': self.sql_count,
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'template_ms': round(self.template_time * 1000, 1),
+        }
+
+    def sql(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+
+
+@contextmanager
+def cache_counting(recorder):
+    """Подменяет get/get_many у кэшей этого потока на время запроса."""
+    backends = [caches[alias] for alias in settings.CACHES]
+    for backend in backends:
+        backend.get = counting_get(recorder, backend.get)
+        backend.get_many = counting_get_many(recorder, backend.get_many)
+    try:
+        yield
+    finally:
+        for backend in backends:
+            del backend.get
+            del backend.get_many
+
+
+def counting_get(recorder, get):
+    missing = object()
+
+    @wraps(get)
+    def wrapper(key, default=None, version=None):
+        recorder.cache_depth += 1
+        try:
+            value = get(key, missing, version)
+        finally:
+            recorder.cache_depth -= 1
+        if not recorder.cache_depth:
+            if value is missing:
+                recorder.cache_misses += 1
+            else:
+                recorder.cache_hits += 1
+        return default if value is missing else value
+    return wrapper
+
+
+def counting_get_many(recorder, get_many):
+    @wraps(get_many)
+    def wrapper(keys, version=None):
+        keys = list(keys)
+        recorder.cache_depth += 1
+        try:
+            found = get_many(keys, version=version)
+        finally:
+            recorder.cache_depth -= 1
+        if not recorder.cache_depth:
+            recorder.cache_hits += len(found)
+            recorder.cache_misses += len(keys) - len(found)
+        return found
+    return wrapper
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        recorder = current.get()
+        if recorder is None:
+            return super().render(context, request)
+        recorder.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            recorder.template_depth -= 1
+            if not recorder.template_depth:
+                recorder.template_time += time.perf_counter() - started
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Шаблонный backend Django, отдающий шаблоны с замером отрисовки."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return Template(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            django_backend.reraise(exc, self)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampled = random.random() < settings.PERFORMANCE_SAMPLE_RATE
+        if not sampled and not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        recorder = Recorder()
+        token = current.set(recorder)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(recorder.sql))
+                stack.enter_context(cache_counting(recorder))
+                response = self.get_response(request)
+        finally:
+            current.reset(token)
+        recorder.finish()
+        if settings.METRICS_ENABLED:
+            metrics.record(request, response, recorder)
+        if sampled:
+            self.report(request, response, recorder)
+        return response
+
+    def report(self, request, response, recorder):
+        response['Server-Timing'] = recorder.server_timing()
+        match = request.resolver_match
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else '',
+            'status': response.status_code,
+            **recorder.fields(),
+        }
+        message = ' '.join(
+            f'{key}={json.dumps(value, ensure_ascii=False)}'
+            for key, value in fields.items())
+        logger.info(message, extra={'performance': fields})
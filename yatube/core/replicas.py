@@ -0,0 +1,127 @@
+"""Чтение с реплик базы для запросов, которые ничего не пишут.
+
+ReplicaRouter всегда пишет в основную базу (default), а читает из одной
+из реплик DATABASE_REPLICAS только внутри запроса, который разрешила
+ReplicaMiddleware:
+
+- метод безопасный (GET, HEAD, OPTIONS), и view не помечена use_primary
+  (подписка, например, пишет на GET);
+- клиент ничего не писал последние REPLICA_LAG_SECONDS секунд: после
+  запроса с записью ставится cookie, и пока она не истекла, клиент
+  читает из основной базы и видит свои изменения;
+- в этом запросе ещё не было записи.
+
+Остальное — команды, фоновые потоки, отдача потоковых ответов — читает
+из основной базы. Реплика выбирается одна на весь запрос.
+
+Реплика может отставать от основной базы не больше REPLICA_LAG_SECONDS:
+страницы, прочитанные с реплики в течение этого срока после изменения
+их областей, не попадают в кэш (posts.caching), иначе устаревшая
+страница жила бы в кэше до следующего изменения. Локально реплика —
+копия файла SQLite, которую обновляет manage.py sync_replicas.
+"""
+import random
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
+
+STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+current = ContextVar('replica_state', default=None)
+
+
+class State:
+    def __init__(self, replica):
+        # Алиас реплики или None — читать из основной базы.
+        self.replica = replica
+        self.wrote = False
+
+
+def use_primary(view):
+    """Помечает view, которая пишет и на безопасных методах."""
+    view.use_primary = True
+    return view
+
+
+def reading_from_replica():
+    state = current.get()
+    return state is not None and state.replica is not None
+
+
+def may_be_stale(changed_ns):
+    """Данные, изменённые в changed_ns, могли ещё не дойти до реплики."""
+    lag_ns = settings.REPLICA_LAG_SECONDS * 10 ** 9
+    return reading_from_replica() and time.time_ns() - changed_ns < lag_ns
+
+
+def sync(alias):
+    """Копирует основную базу SQLite в реплику alias (backup API)."""
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current.get()
+        if state is None or state.replica is None:
+            return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = current.get()
+        if state is not None:
+            # Дальше в этом запросе читаем только что записанное.
+            state.wrote = True
+            state.replica = None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # В репликах те же данные, что и в основной базе.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = State(self.choose(request))
+        token = current.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        if state.wrote or request.method not in SAFE_METHODS:
+            lag = settings.REPLICA_LAG_SECONDS
+            response.set_cookie(STICKY_COOKIE, f'{time.time() + lag:.3f}',
+                                max_age=lag, httponly=True,
+                                samesite='Lax')
+        return response
+
+    def choose(self, request):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or request.method not in SAFE_METHODS:
+            return None
+        try:
+            sticky_until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+        except ValueError:
+            sticky_until = 0
+        if sticky_until > time.time():
+            return None
+        return random.choice(replicas)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'use_primary', False):
+            current.get().replica = None
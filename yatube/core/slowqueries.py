@@ -0,0 +1,150 @@
+"""Журнал медленных SQL-запросов с планом выполнения.
+
+SlowQueryMiddleware на время запроса ставит execute_wrapper на все
+соединения. Запрос дольше SLOW_QUERY_MS миллисекунд пишется в логгер
+core.slowqueries (WARNING) и в файл SQLite SLOW_QUERY_LOG_PATH: имя URL,
+отпечаток SQL (литералы и списки IN заменены на ?, так что одинаковые
+по форме запросы складываются вместе), сам запрос, время и вывод
+EXPLAIN QUERY PLAN для SQLite. Сводку по отпечаткам выводит команда
+slowqueries.
+"""
+import hashlib
+import logging
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.sqlite3.base import SQLiteCursorWrapper
+
+from posts.localdb import LocalDatabase
+
+SCHEMA = ('CREATE TABLE IF NOT EXISTS entries ('
+          'id INTEGER PRIMARY KEY, logged REAL NOT NULL, '
+          'view TEXT NOT NULL, fingerprint TEXT NOT NULL, '
+          'normalized TEXT NOT NULL, sql TEXT NOT NULL, '
+          'duration REAL NOT NULL, plan TEXT NOT NULL)')
+SUMMARY_SQL = """
+    SELECT fingerprint, count(*), sum(duration), max(duration),
+           group_concat(DISTINCT view), normalized
+    FROM entries
+    GROUP BY fingerprint
+    ORDER BY sum(duration) DESC
+    LIMIT ?
+"""
+WORST_SQL = """
+    SELECT sql, plan FROM entries
+    WHERE fingerprint = ?
+    ORDER BY duration DESC
+    LIMIT 1
+"""
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(?+)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+logger = logging.getLogger(__name__)
+
+store = LocalDatabase(lambda: settings.SLOW_QUERY_LOG_PATH, SCHEMA)
+
+
+def normalize(sql):
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12]
+
+
+def explain(connection, sql, params):
+    """EXPLAIN QUERY PLAN деревом, как в консоли sqlite3.
+
+    EXPLAIN выполняется прямо на соединении sqlite3, мимо обёрток
+    Django: его не замеряют ни этот журнал, ни счётчики запросов
+    страницы (core.performance).
+    """
+    if (connection.vendor != 'sqlite'
+            or not sql.lstrip().upper().startswith(EXPLAINABLE)):
+        return ''
+    # Курсор бэкенда Django: он переводит параметры %s в ?.
+    cursor = connection.connection.cursor(factory=SQLiteCursorWrapper)
+    try:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        rows = cursor.fetchall()
+    except Exception as error:
+        return f'EXPLAIN не удался: {error}'
+    finally:
+        cursor.close()
+    depth = {0: -1}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, -1) + 1
+        lines.append('  ' * depth[node] + detail)
+    return '\n'.join(lines)
+
+
+class SlowQueryLog:
+    """execute_wrapper, записывающий медленные запросы одного HTTP-запроса."""
+
+    def __init__(self, request, threshold):
+        self.request = request
+        self.threshold = threshold
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.log(sql, params, many, duration, context['connection'])
+
+    def log(self, sql, params, many, duration, connection):
+        match = self.request.resolver_match
+        view = match.view_name if match else self.request.path
+        normalized = normalize(sql)
+        # У executemany несколько наборов параметров — план не строится.
+        plan = '' if many else explain(connection, sql, params)
+        key = fingerprint(normalized)
+        logger.warning('Медленный запрос %.1f мс [%s] %s: %s\n%s',
+                       duration * 1000, view, key, sql, plan,
+                       extra={'view': view, 'fingerprint': key,
+                              'duration': duration})
+        store.execute(
+            'INSERT INTO entries (logged, view, fingerprint, normalized, '
+            'sql, duration, plan) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (time.time(), view, key, normalized, sql, duration, plan))
+
+
+def summary(limit=10):
+    """Худшие отпечатки по суммарному времени с планом самого долгого."""
+    rows = store.execute(SUMMARY_SQL, (limit,)).fetchall()
+    return [
+        (*row, *store.execute(WORST_SQL, (row[0],)).fetchone())
+        for row in rows
+    ]
+
+
+def clear():
+    store.execute('DELETE FROM entries')
+
+
+class SlowQueryMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_MS is None:
+            return self.get_response(request)
+        log = SlowQueryLog(request, settings.SLOW_QUERY_MS / 1000)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(log))
+            return self.get_response(request)
@@ -0,0 +1,50 @@
+"""Профиль соединений SQLite для нескольких процессов сервера.
+
+На каждом новом соединении с базой SQLite (сигнал connection_created)
+выполняются прагмы из SQLITE_PRAGMAS, поверх которых накладывается
+словарь PRAGMAS из настроек самой базы в DATABASES:
+
+- busy_timeout — сколько миллисекунд ждать чужую запись, прежде чем
+  ответить «database is locked»; стоит первым, чтобы и смена журнала
+  ждала, а не падала;
+- journal_mode=WAL — чтение не ждёт записи, запись не ждёт чтения;
+- synchronous=NORMAL — в WAL fsync только на контрольной точке: при
+  сбое питания теряются последние транзакции, но не целостность базы;
+- cache_size (отрицательное — в КиБ) и mmap_size — кэш страниц
+  соединения и чтение файла через отображение в память;
+- temp_store=MEMORY — временные B-деревья сортировок не пишутся на диск.
+
+Прагмы действуют, пока живёт соединение, поэтому вместе с ними
+включается CONN_MAX_AGE: соединение переживает запрос. Режим журнала,
+наоборот, хранится в файле; пока открыты другие соединения, сменить его
+нельзя — тогда пишется предупреждение, и попытку повторит следующее
+соединение.
+"""
+import logging
+import sqlite3
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+
+def pragmas(connection):
+    return {**settings.SQLITE_PRAGMAS,
+            **connection.settings_dict.get('PRAGMAS', {})}
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    # Напрямую через sqlite3: мимо execute_wrapper и журнала SQL.
+    for name, value in pragmas(connection).items():
+        try:
+            connection.connection.execute(f'PRAGMA {name} = {value}')
+        except sqlite3.OperationalError as error:
+            if name != 'journal_mode':
+                raise
+            logger.warning('Не удалось включить journal_mode=%s: %s',
+                           value, error)
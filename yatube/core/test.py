@@ -1,4 +1,34 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db import connections
+from django.db import OperationalError
+from django.db import router
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import Client
+from django.test import override_settings
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+
+from core import metrics
+from core import replicas
+from core import slowqueries
+from core import writes
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Post
+from posts.models import User
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +36,515 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed('/core/404.html')
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp()
+CONTENT = bytes(range(256)) * 4
+URL = '/media/posts/file.bin'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServeTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+        cls.path = os.path.join(TEMP_MEDIA_ROOT, 'posts', 'file.bin')
+        with open(cls.path, 'wb') as file:
+            file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_full_file_with_validators(self):
+        '''Файл отдаётся потоком с ETag и Last-Modified.'''
+        response = self.client.get(URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_conditional_requests(self):
+        '''Совпавшие ETag или дата дают 304.'''
+        etag = self.client.get(URL)['ETag']
+        mtime = http_date(os.stat(self.path).st_mtime)
+        for header, value in (('HTTP_IF_NONE_MATCH', etag),
+                              ('HTTP_IF_MODIFIED_SINCE', mtime)):
+            with self.subTest(header=header):
+                response = self.client.get(URL, **{header: value})
+                self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        '''Диапазоны Range отдаются с кодом 206.'''
+        cases = (
+            ('bytes=0-9', CONTENT[:10], 'bytes 0-9/1024'),
+            ('bytes=1000-', CONTENT[1000:], 'bytes 1000-1023/1024'),
+            ('bytes=-4', CONTENT[-4:], 'bytes 1020-1023/1024'),
+        )
+        for header, body, content_range in cases:
+            with self.subTest(header=header):
+                response = self.client.get(URL, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(b''.join(response.streaming_content), body)
+                self.assertEqual(response['Content-Range'], content_range)
+
+    def test_bad_ranges(self):
+        '''Недостижимый диапазон — 416, устаревший If-Range — весь файл.'''
+        response = self.client.get(URL, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get(URL, HTTP_RANGE='bytes=0-9',
+                                   HTTP_IF_RANGE='"old"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_and_outside_files(self):
+        '''Несуществующий файл и выход за MEDIA_ROOT дают 404.'''
+        for url in ('/media/posts/none.bin', '/media/../settings.py',
+                    '/media/posts/'):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect')
+    def test_accel_redirect(self):
+        '''С MEDIA_SENDFILE тело отдаёт фронтовой сервер.'''
+        response = self.client.get(URL)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/file.bin')
+        self.assertEqual(response.content, b'')
+
+
+@override_settings(PERFORMANCE_SAMPLE_RATE=1)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def get_timing(self, url):
+        with self.assertLogs('core.performance', 'INFO') as logs:
+            response = self.client.get(url)
+        self.assertEqual(len(logs.records), 1)
+        return response, logs.records[0]
+
+    def test_metrics(self):
+        '''Заголовок и строка журнала содержат SQL, кэш и шаблоны.'''
+        response, record = self.get_timing('/')
+        fields = record.performance
+        self.assertEqual(fields['view'], 'posts:index')
+        self.assertGreater(fields['sql_count'], 0)
+        self.assertGreater(fields['cache_misses'], 0)
+        self.assertGreater(fields['template_ms'], 0)
+        self.assertGreaterEqual(fields['total_ms'], fields['sql_ms'])
+        self.assertIn('view="posts:index"', record.getMessage())
+        header = response['Server-Timing']
+        self.assertIn(f'sql;dur={fields["sql_ms"]:.1f};'
+                      f'desc="{fields["sql_count"]} queries"', header)
+        self.assertIn('tpl;dur=', header)
+        self.assertIn('total;dur=', header)
+        # Вторая загрузка берёт страницу из кэша без шаблонов.
+        _, record = self.get_timing('/')
+        self.assertGreater(record.performance['cache_hits'], 0)
+        self.assertEqual(record.performance['template_ms'], 0)
+
+    def test_every_app(self):
+        '''Замеряются представления users и core (в т. ч. 404).'''
+        response, record = self.get_timing('/auth/signup/')
+        self.assertEqual(record.performance['view'], 'users:signup')
+        self.assertIn('Server-Timing', response)
+        response, record = self.get_timing('/nonexist-page/')
+        self.assertEqual(record.performance['status'], 404)
+        self.assertGreater(record.performance['template_ms'], 0)
+
+    @override_settings(PERFORMANCE_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        '''Запросы вне выборки не замеряются.'''
+        response = self.client.get('/')
+        self.assertNotIn('Server-Timing', response)
+
+
+TEMP_METRICS_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_ENABLED=True, PERFORMANCE_SAMPLE_RATE=0,
+                   METRICS_PATH=os.path.join(TEMP_METRICS_DIR, 'm.sqlite3'),
+                   METRICS_TOKEN='test_token')
+class MetricsTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        metrics.flush()
+        metrics.store.execute('DELETE FROM samples')
+
+    def fetch(self, authorization='Bearer test_token'):
+        return self.client.get('/metrics', HTTP_AUTHORIZATION=authorization)
+
+    def get_metrics(self):
+        response = self.fetch()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        lines = response.content.decode().splitlines()
+        return dict(line.rsplit(' ', 1) for line in lines
+                    if not line.startswith('#'))
+
+    def test_histograms_per_url_name(self):
+        '''Запросы, время, SQL и кэш учитываются по имени URL.'''
+        for _ in range(2):
+            self.client.get('/')
+        self.client.get('/nonexist-page/')
+        samples = self.get_metrics()
+        view = '{view="posts:index"}'
+        self.assertEqual(samples['yatube_requests_total{view="posts:index",'
+                                 'method="GET",status="200"}'], '2')
+        self.assertEqual(samples[f'yatube_request_duration_seconds_count'
+                                 f'{view}'], '2')
+        self.assertEqual(samples['yatube_request_duration_seconds_bucket'
+                                 '{view="posts:index",le="+Inf"}'], '2')
+        self.assertIn('yatube_db_queries_bucket'
+                      '{view="posts:index",le="0"}', samples)
+        self.assertGreater(float(samples[f'yatube_db_queries_sum{view}']), 0)
+        self.assertGreater(
+            float(samples[f'yatube_cache_hits_total{view}']), 0)
+        self.assertIn('yatube_requests_total{view="<unresolved>",'
+                      'method="GET",status="404"}', samples)
+
+    def test_buckets_are_ordered(self):
+        '''Корзины гистограммы идут по возрастанию, затем _sum и _count.'''
+        self.client.get('/')
+        lines = [line for line in self.fetch().content.decode().splitlines()
+                 if line.startswith('yatube_request_duration_seconds')
+                 and 'posts:index' in line]
+        bounds = [line.split('le="')[1].split('"')[0]
+                  for line in lines if '_bucket' in line]
+        self.assertEqual([float(bound) for bound in bounds],
+                         [*metrics.SECONDS_BUCKETS, float('inf')])
+        self.assertIn('_sum', lines[-2])
+        self.assertIn('_count', lines[-1])
+
+    def test_processes_are_summed(self):
+        '''Приращения разных процессов складываются в общем файле.'''
+        labels = {'view': 'posts:profile'}
+        pid = os.fork()
+        if pid == 0:
+            metrics.inc('yatube_cache_hits_total', labels, 3)
+            metrics.flush()
+            os._exit(0)
+        os.waitpid(pid, 0)
+        metrics.inc('yatube_cache_hits_total', labels, 2)
+        samples = self.get_metrics()
+        self.assertEqual(samples['yatube_cache_hits_total'
+                                 '{view="posts:profile"}'], '5')
+
+    def test_forbidden_without_token(self):
+        '''Без верного токена метрики не отдаются, даже с 127.0.0.1.'''
+        for authorization in ('', 'Bearer wrong_token', 'test_token'):
+            with self.subTest(authorization=authorization):
+                self.assertEqual(self.fetch(authorization).status_code, 403)
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.fetch('Bearer ').status_code, 403)
+
+
+TEMP_SLOW_QUERY_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    SLOW_QUERY_MS=0,
+    SLOW_QUERY_LOG_PATH=os.path.join(TEMP_SLOW_QUERY_DIR, 'slow.sqlite3'))
+class SlowQueryTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_SLOW_QUERY_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        slowqueries.clear()
+
+    def test_normalize(self):
+        '''Литералы, параметры и списки IN сводятся к одному отпечатку.'''
+        first = slowqueries.normalize(
+            "SELECT * FROM t WHERE id IN (%s, %s) AND s = 'a'  LIMIT 10")
+        second = slowqueries.normalize(
+            "SELECT * FROM t WHERE id IN (%s) AND s = 'b''c' LIMIT 20")
+        self.assertEqual(first, 'SELECT * FROM t WHERE id IN (?+) '
+                                'AND s = ? LIMIT ?')
+        self.assertEqual(first, second)
+
+    def test_log_and_summary(self):
+        '''Запросы страницы пишутся с URL, отпечатком и планом.'''
+        with self.assertLogs('core.slowqueries', 'WARNING') as logs:
+            self.client.get('/')
+        record = logs.records[0]
+        self.assertEqual(record.view, 'posts:index')
+        rows = slowqueries.summary(limit=100)
+        self.assertTrue(rows)
+        plans = [plan for *_, plan in rows if 'posts_post' in plan]
+        self.assertTrue(plans)
+        self.assertTrue(all(views == 'posts:index'
+                            for _, _, _, _, views, *_ in rows))
+        output = StringIO()
+        call_command('slowqueries', '--limit', '1', '--clear',
+                     stdout=output)
+        self.assertIn(rows[0][0], output.getvalue())
+        self.assertIn('posts:index', output.getvalue())
+        self.assertEqual(slowqueries.summary(), [])
+
+    def test_explain_is_not_a_page_query(self):
+        '''EXPLAIN идёт мимо обёрток соединения и не считается запросом.'''
+        with CaptureQueriesContext(connection) as queries, \
+                self.assertLogs('core.slowqueries', 'WARNING'):
+            self.client.get('/')
+        self.assertTrue(slowqueries.summary())
+        self.assertFalse([query for query in queries
+                          if query['sql'].startswith('EXPLAIN')])
+
+    @override_settings(SLOW_QUERY_MS=None)
+    def test_disabled(self):
+        '''При SLOW_QUERY_MS = None ничего не пишется.'''
+        self.client.get('/')
+        self.assertEqual(slowqueries.summary(), [])
+
+
+TEMP_SQLITE_DIR = tempfile.mkdtemp()
+
+
+class SQLiteProfileTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_SQLITE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def open(self, name, pragmas):
+        wrapper = DatabaseWrapper({
+            **connection.settings_dict,
+            'NAME': os.path.join(TEMP_SQLITE_DIR, name),
+            'PRAGMAS': pragmas,
+        }, alias=name)
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_profile_applied(self):
+        '''Новое соединение получает прагмы SQLITE_PRAGMAS.'''
+        wrapper = self.open('profile.sqlite3', {})
+        expected = {'journal_mode': 'wal', 'synchronous': 1,
+                    'busy_timeout': 5000, 'temp_store': 2,
+                    'cache_size': -20000, 'mmap_size': 256 * 1024 * 1024}
+        for name, value in expected.items():
+            with self.subTest(pragma=name):
+                self.assertEqual(self.pragma(wrapper, name), value)
+
+    def test_database_pragmas_override_profile(self):
+        '''PRAGMAS базы в DATABASES дополняет общий профиль.'''
+        wrapper = self.open('override.sqlite3', {'cache_size': -1000,
+                                                 'query_only': 1})
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -1000)
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 1)
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+
+    def test_busy_journal_mode_is_not_fatal(self):
+        '''Занятый файл не даёт сменить журнал, но соединение работает.'''
+        self.open('busy.sqlite3', {})
+        other = sqlite3.connect(os.path.join(TEMP_SQLITE_DIR, 'busy.sqlite3'))
+        self.addCleanup(other.close)
+        other.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        with self.assertLogs('core.sqlite', 'WARNING'):
+            wrapper = self.open('busy.sqlite3', {'busy_timeout': 0,
+                                                 'journal_mode': 'DELETE'})
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+
+
+TEMP_REPLICA_DIR = tempfile.mkdtemp()
+REPLICA = 'replica'
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # После super(): реплику не закрывает запрет на чужие базы,
+        # и в ней нет транзакции теста — sync() может в неё писать.
+        connections.databases[REPLICA] = {
+            **connection.settings_dict,
+            'NAME': os.path.join(TEMP_REPLICA_DIR, 'replica.sqlite3'),
+        }
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(TEMP_REPLICA_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username='test_author')
+        self.post = Post.objects.create(author=self.author, text='old_post')
+        self.reader = User.objects.create(username='test_reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        replicas.sync(REPLICA)
+
+    def test_guest_reads_replica(self):
+        '''Гость читает с реплики; свежую страницу с неё не кэшируем.'''
+        Post.objects.create(author=self.author, text='new_post')
+        url = reverse('posts:profile', args=[self.author.username])
+        response = self.client.get(url)
+        self.assertContains(response, 'old_post')
+        self.assertNotContains(response, 'new_post')
+        self.assertNotIn('ETag', response)
+        replicas.sync(REPLICA)
+        self.assertContains(self.client.get(url), 'new_post')
+
+    def test_writer_reads_own_writes(self):
+        '''После записи клиент читает из основной базы, пока жива cookie.'''
+        url = reverse('posts:post_detail', args=[self.post.id])
+        response = self.reader_client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'test_comment'})
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        self.assertContains(self.reader_client.get(url), 'test_comment')
+        self.assertNotContains(self.client.get(url), 'test_comment')
+        cache.clear()
+        self.reader_client.cookies[replicas.STICKY_COOKIE] = '0'
+        self.assertNotContains(self.reader_client.get(url), 'test_comment')
+
+    def test_write_views_use_primary(self):
+        '''Подписка по GET читает и пишет только в основной базе.'''
+        url = reverse('posts:profile_follow', args=[self.author.username])
+        with CaptureQueriesContext(connections[REPLICA]) as queries:
+            response = self.reader_client.get(url)
+        self.assertEqual(len(queries), 0)
+        self.assertIn(replicas.STICKY_COOKIE, response.cookies)
+        self.assertTrue(Follow.objects.filter(
+            user=self.reader, author=self.author).exists())
+
+    def test_outside_request_reads_primary(self):
+        '''Команды и фоновые потоки читают из основной базы.'''
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+
+TEMP_WRITES_DIR = tempfile.mkdtemp()
+
+
+@override_settings(METRICS_ENABLED=True, WRITE_RETRY_DELAY=0.01,
+                   METRICS_PATH=os.path.join(TEMP_WRITES_DIR, 'm.sqlite3'))
+class WriteTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_WRITES_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        metrics.flush()
+        metrics.store.execute('DELETE FROM samples')
+        self.author = User.objects.create(username='test_author')
+        self.post = Post.objects.create(author=self.author, text='test_post')
+        self.reader = User.objects.create(username='test_reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        # Второе соединение с той же базой держит блокировку на запись.
+        self.holder = sqlite3.connect(
+            connection.settings_dict['NAME'], uri=True,
+            isolation_level=None, check_same_thread=False)
+        self.holder.execute('BEGIN IMMEDIATE')
+
+    def tearDown(self):
+        if self.holder.in_transaction:
+            self.holder.execute('ROLLBACK')
+        self.holder.close()
+
+    def samples(self):
+        lines = metrics.render().splitlines()
+        return dict(line.rsplit(' ', 1) for line in lines
+                    if not line.startswith('#'))
+
+    def add_comment(self):
+        return self.reader_client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'test_comment'})
+
+    @override_settings(WRITE_RETRIES=20)
+    def test_retries_until_lock_is_released(self):
+        '''Запись ждёт чужую транзакцию повторами и не падает.'''
+        timer = threading.Timer(0.05, self.holder.execute, ['COMMIT'])
+        timer.start()
+        with self.assertLogs('core.writes', 'WARNING') as logs:
+            response = self.add_comment()
+        timer.join()
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.filter(
+            post=self.post, text='test_comment').exists())
+        self.assertIn('add_comment', logs.output[0])
+        samples = self.samples()
+        labels = '{operation="add_comment"}'
+        self.assertEqual(samples[f'yatube_db_write_retries_total{labels}'],
+                         str(len(logs.records)))
+        self.assertEqual(samples[f'yatube_db_lock_wait_seconds_count'
+                                 f'{labels}'], '1')
+        self.assertGreater(float(samples[f'yatube_db_lock_wait_seconds_sum'
+                                         f'{labels}']), 0)
+        self.assertEqual(samples[f'yatube_db_write_failures_total{labels}'],
+                         '0')
+
+    @override_settings(WRITE_RETRIES=1)
+    def test_gives_up_after_retries(self):
+        '''После WRITE_RETRIES повторов ошибка уходит наверх и учитывается.'''
+        create = mock.Mock(side_effect=lambda: Post.objects.create(
+            author=self.author, text='new_post'))
+        with self.assertLogs('core.writes', 'WARNING'):
+            with self.assertRaisesMessage(OperationalError, 'locked'):
+                writes.run('post_create', create)
+        create.assert_not_called()
+        self.holder.execute('ROLLBACK')
+        self.assertFalse(Post.objects.filter(text='new_post').exists())
+        samples = self.samples()
+        self.assertEqual(samples['yatube_db_write_failures_total'
+                                 '{operation="post_create"}'], '1')
+
+    @override_settings(WRITE_BATCH_WINDOW=5, WRITE_BATCH_SIZE=3)
+    def test_small_writes_share_transaction(self):
+        '''Записи соседних потоков фиксируются одной транзакцией.'''
+        self.holder.execute('ROLLBACK')
+        results = {}
+
+        def comment(text):
+            if text == 'broken':
+                raise ValueError(text)
+            return Comment.objects.create(post=self.post, author=self.reader,
+                                          text=text).pk
+
+        def submit(text):
+            try:
+                results[text] = writes.submit('add_comment',
+                                              lambda: comment(text))
+            except ValueError as error:
+                results[text] = error
+            finally:
+                connections.close_all()
+
+        with mock.patch.object(writes, 'begin_immediate',
+                               wraps=writes.begin_immediate) as begin:
+            threads = [threading.Thread(target=submit, args=[text])
+                       for text in ('first', 'broken', 'second')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(begin.call_count, 1)
+        self.assertIsInstance(results['broken'], ValueError)
+        self.assertEqual(
+            set(Comment.objects.values_list('pk', flat=True)),
+            {results['first'], results['second']})
@@ -0,0 +1,56 @@
+"""Служебные файлы приложения во время тестов.
+
+Файлы SQLite рядом с кодом (метаданные миниатюр, метрики, журнал
+медленных запросов, поколения кэша), дисковый кэш картинок и загрузки на время
+прогона тестов переносятся во временный каталог, который потом
+удаляется. Так работают и manage.py test (TEST_RUNNER), и pytest
+(conftest.py в корне репозитория).
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+from core import metrics
+
+RUNTIME_PATHS = (
+    'THUMBNAIL_KVSTORE_PATH',
+    'METRICS_PATH',
+    'SLOW_QUERY_LOG_PATH',
+    'CACHE_GENERATIONS_PATH',
+    'RESIZE_CACHE_ROOT',
+    'MEDIA_ROOT',
+)
+
+
+@contextmanager
+def temporary_runtime_files():
+    directory = tempfile.mkdtemp(prefix='yatube-test-')
+    paths = {name: os.path.join(directory,
+                                os.path.basename(getattr(settings, name)))
+             for name in RUNTIME_PATHS}
+    try:
+        with override_settings(**paths):
+            yield directory
+            # Иначе накопленное допишет в настоящий файл atexit, а
+            # миниатюры из пула — в настоящий MEDIA_ROOT.
+            metrics.flush()
+            from posts import thumbnails
+            thumbnails.shutdown()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TemporaryFilesRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.runtime_files = temporary_runtime_files()
+        self.runtime_files.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self.runtime_files.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,173 @@
+"""Запись в SQLite при конкуренции процессов за блокировку.
+
+Транзакция Django в SQLite начинается с BEGIN (DEFERRED): блокировка
+на запись берётся первым изменением. Если транзакция перед этим уже
+читала, а другой процесс успел начать или зафиксировать запись, SQLite
+отвечает «database is locked» сразу, не дожидаясь busy_timeout: ждать
+бесполезно, прочитанные данные устарели.
+Поэтому запись из view идёт через run (или контекстный менеджер write):
+
+- транзакция начинается с BEGIN IMMEDIATE — блокировка берётся до
+  первого запроса, ожидание укладывается в busy_timeout, а все записи
+  view (пост, лента подписчиков, счётчики) фиксируются вместе;
+- если блокировку не удалось получить и за busy_timeout, BEGIN IMMEDIATE
+  повторяется до WRITE_RETRIES раз через случайную паузу от нуля до
+  WRITE_RETRY_DELAY, удваивающегося с каждой попыткой. Повторяется
+  только взятие блокировки: сама запись ещё не начиналась, и её
+  побочные эффекты не выполнятся дважды;
+- повторы пишутся в логгер core.writes (WARNING), а в метрики
+  (core.metrics) — число повторов, время ожидания блокировки и отказы
+  по имени операции.
+
+submit собирает мелкие записи (комментарии, подписки) соседних потоков
+процесса в одну транзакцию: первая запись ждёт WRITE_BATCH_WINDOW
+секунд (или WRITE_BATCH_SIZE записей) и выполняет всю пачку, каждую
+запись в своей точке сохранения — ошибка одной не откатывает другие.
+Пачка имеет смысл только для воркеров с потоками (gunicorn --threads);
+при WRITE_BATCH_WINDOW = None submit — то же, что run.
+
+Внутри уже открытой транзакции (в том числе в тестах на TestCase) и
+для других СУБД run и submit просто выполняют запись в transaction.atomic.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db import DEFAULT_DB_ALIAS
+from django.db import OperationalError
+from django.db import transaction
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Пачки, которые ещё набираются, по алиасу базы.
+_batches = {}
+_batches_lock = threading.Lock()
+
+
+def is_locked(error):
+    return 'locked' in str(error)
+
+
+def begin_immediate(connection, operation):
+    """BEGIN IMMEDIATE с повторами; учитывает ожидание в метриках."""
+    started = time.perf_counter()
+    delay = settings.WRITE_RETRY_DELAY
+    retries = 0
+    while True:
+        try:
+            connection.cursor().execute('BEGIN IMMEDIATE')
+            break
+        except OperationalError as error:
+            if not is_locked(error):
+                raise
+            if retries >= settings.WRITE_RETRIES:
+                metrics.record_write(operation, retries,
+                                     time.perf_counter() - started,
+                                     failed=True)
+                raise
+        retries += 1
+        pause = random.uniform(0, delay)
+        logger.warning('База занята (%s): попытка %d из %d через %.0f мс',
+                       operation, retries, settings.WRITE_RETRIES,
+                       pause * 1000,
+                       extra={'operation': operation, 'retry': retries})
+        time.sleep(pause)
+        delay *= 2
+    metrics.record_write(operation, retries, time.perf_counter() - started)
+
+
+@contextmanager
+def write(operation, using=DEFAULT_DB_ALIAS):
+    """transaction.atomic, начатый в SQLite с BEGIN IMMEDIATE."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        with transaction.atomic(using):
+            yield
+        return
+    # Django начинает транзакцию SQLite этим методом соединения; на время
+    # входа в atomic его заменяет атрибут экземпляра.
+    connection._start_transaction_under_autocommit = (
+        lambda: begin_immediate(connection, operation))
+    try:
+        with transaction.atomic(using):
+            del connection._start_transaction_under_autocommit
+            yield
+    finally:
+        connection.__dict__.pop('_start_transaction_under_autocommit', None)
+
+
+def run(operation, func, using=DEFAULT_DB_ALIAS):
+    """Выполняет func в транзакции write и возвращает её результат."""
+    with write(operation, using):
+        return func()
+
+
+class Item:
+    def __init__(self, operation, func):
+        self.operation = operation
+        self.func = func
+        # Запись выполняется в потоке первой записи пачки, но с
+        # контекстом своего запроса (core.replicas).
+        self.context = contextvars.copy_context()
+        self.result = None
+        self.error = None
+
+
+class Batch:
+    def __init__(self):
+        self.items = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+    def execute(self, using):
+        operation = ','.join(sorted({item.operation for item in self.items}))
+        try:
+            with write(operation, using):
+                for item in self.items:
+                    try:
+                        with transaction.atomic(using):
+                            item.result = item.context.run(item.func)
+                    except Exception as error:
+                        item.error = error
+        except Exception as error:
+            # Пачка не зафиксирована — не удалась каждая запись.
+            for item in self.items:
+                item.result, item.error = None, error
+        finally:
+            self.done.set()
+
+
+def submit(operation, func, using=DEFAULT_DB_ALIAS):
+    """Как run, но func может выполниться в общей транзакции с соседями."""
+    window = settings.WRITE_BATCH_WINDOW
+    if window is None or connections[using].in_atomic_block:
+        return run(operation, func, using)
+    item = Item(operation, func)
+    with _batches_lock:
+        batch = _batches.get(using)
+        leader = batch is None
+        if leader:
+            batch = _batches[using] = Batch()
+        batch.items.append(item)
+        if len(batch.items) >= settings.WRITE_BATCH_SIZE:
+            # В полную пачку больше не добавляем.
+            del _batches[using]
+            batch.full.set()
+    if leader:
+        batch.full.wait(window)
+        with _batches_lock:
+            if _batches.get(using) is batch:
+                del _batches[using]
+        batch.execute(using)
+    else:
+        batch.done.wait()
+    if item.error is not None:
+        raise item.error
+    return item.result
@@ -1,6 +1,27 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
 
+from . import search
 from .models import Post, Group, Comment, Follow
+from .paginators import EstimatedCountPaginator
+
+
+class ScaleModelAdmin(admin.ModelAdmin):
+    """Список без полного COUNT(*) и с выбором пользователей по id."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    empty_value_display = '-пусто-'
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        # В list_editable каждая строка списка строит свой select; варианты
+        # загружаются один раз за запрос, а не на каждую строку.
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name in self.list_editable:
+            cache = request.__dict__.setdefault('_admin_choices', {})
+            if db_field.name not in cache:
+                cache[db_field.name] = list(iter(field.choices))
+            field.choices = cache[db_field.name]
+        return field
 
 
 class GroupAdmin(admin.ModelAdmin):
@@ -12,30 +33,42 @@ class GroupAdmin(admin.ModelAdmin):
 admin.site.register(Group, GroupAdmin)
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(ScaleModelAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
     search_fields = ('text',)
     list_filter = ('pub_date',)
-    empty_value_display = '-пусто-'
+    date_hierarchy = 'pub_date'
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по тексту идёт через FTS5-индекс, а не LIKE '%…%'.
+        match = search.to_match(search_term)
+        if not match:
+            return queryset, False
+        return queryset.filter(
+            pk__in=RawSQL(search.POST_IDS_SQL, [match])), False
 
 
 admin.site.register(Post, PostAdmin)
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(ScaleModelAdmin):
     list_display = ('pk', 'author', 'text', 'created')
-    search_fields = ('author', 'text')
-    empty_value_display = '-пусто-'
+    list_select_related = ('author',)
+    raw_id_fields = ('post', 'author')
+    search_fields = ('author__username', 'text')
 
 
 admin.site.register(Comment, CommentAdmin)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(ScaleModelAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user', 'author')
-    empty_value_display = '-пусто-'
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
 
 
 admin.site.register(Follow, FollowAdmin)
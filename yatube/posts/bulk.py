@@ -0,0 +1,17 @@
+"""bulk_create с учётом ограничений SQLite.
+
+Django 2.2 не уменьшает явно заданный batch_size до предела базы: у
+SQLite это 999 параметров и 500 строк в составном SELECT на запрос, и
+слишком большая пачка падает с OperationalError.
+"""
+from django.db import connections
+from django.db import router
+
+
+def bulk_create(model, objs, batch_size=None, **kwargs):
+    objs = list(objs)
+    connection = connections[router.db_for_write(model)]
+    limit = max(connection.ops.bulk_batch_size(
+        model._meta.concrete_fields, objs), 1)
+    return model.objects.bulk_create(
+        objs, batch_size=min(batch_size or limit, limit), **kwargs)
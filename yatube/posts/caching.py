@@ -0,0 +1,232 @@
+"""Кэш страниц с инвалидацией по счётчикам поколений.
+
+Каждая страница зависит от набора областей (scope): всей ленты, группы,
+автора или поста. У области есть номер поколения; ключ страницы
+включает номера поколений её областей, поэтому изменение данных
+(bump) сразу делает устаревшие страницы недостижимыми, а сами записи
+живут долго и не истекают одновременно. Номер поколения — время его
+смены в наносекундах, так что он же служит датой изменения области.
+
+Кроме своих областей страница зависит от областей, данные которых
+показывает: карточка поста выводит число постов автора и название
+группы (depends_on). Эти области становятся известны при рендеринге;
+они запоминаются для адреса страницы и входят в её ключ при следующих
+запросах. Поэтому новый пост или переименование группы меняют
+поколение одной области, а не всех страниц с постами автора или группы.
+
+Поколения и зависимости лежат не в кэше, а в общем для всех процессов
+сервера файле SQLite (CACHE_GENERATIONS_PATH): кэш страниц у каждого
+процесса свой, и bump в одном процессе или в фоновом потоке должны
+видеть все. bump вызывается после фиксации транзакции с изменением:
+иначе запрос, читающий ещё старые данные, закэшировал бы их под новым
+поколением.
+Страница, прочитанная с реплики базы вскоре после изменения, может быть
+устаревшей и не кэшируется (core.replicas).
+"""
+import hashlib
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core import replicas
+from posts.localdb import LocalDatabase
+from posts.settings import PAGE_CACHE_TIMEOUT
+
+SCHEMA = ('CREATE TABLE IF NOT EXISTS generations ('
+          'scope TEXT PRIMARY KEY, generation INTEGER NOT NULL) WITHOUT ROWID')
+# Области, показанные на странице page (хэш адреса) с областью scope.
+DEPENDENCIES_SCHEMA = ('CREATE TABLE IF NOT EXISTS dependencies ('
+                       'scope TEXT, page TEXT, dependency TEXT, '
+                       'PRIMARY KEY (scope, page, dependency)) WITHOUT ROWID')
+# Поколение только растёт, даже если часы процессов немного расходятся.
+BUMP_SQL = ('INSERT INTO generations (scope, generation) VALUES (?, ?) '
+            'ON CONFLICT (scope) DO UPDATE SET '
+            'generation = max(excluded.generation, generation + 1)')
+PAGE_KEY = 'page:{}:{}'
+
+store = LocalDatabase(lambda: settings.CACHE_GENERATIONS_PATH, SCHEMA,
+                      DEPENDENCIES_SCHEMA)
+
+# Области, показанные при рендеринге текущей страницы.
+shown = ContextVar('shown_scopes', default=None)
+
+
+def posts_scope():
+    return 'posts'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def post_page_scopes(post, *group_slugs):
+    """Области страниц, на которых виден пост."""
+    return [
+        posts_scope(),
+        author_scope(post.author.username),
+        post_scope(post.pk),
+        *(group_scope(slug) for slug in group_slugs if slug),
+    ]
+
+
+def new_generation():
+    return time.time_ns()
+
+
+def select_generations(scopes):
+    placeholders = ', '.join('?' * len(scopes))
+    return dict(store.execute(
+        f'SELECT scope, generation FROM generations '
+        f'WHERE scope IN ({placeholders})', scopes))
+
+
+def get_generations(scopes, first=None):
+    """Поколения областей; новой области — first или текущее время."""
+    generations = select_generations(scopes)
+    missing = [scope for scope in scopes if scope not in generations]
+    if missing:
+        store.connection.executemany(
+            'INSERT OR IGNORE INTO generations (scope, generation) '
+            'VALUES (?, ?)',
+            [(scope, first or new_generation()) for scope in missing])
+        generations.update(select_generations(missing))
+    return [generations[scope] for scope in scopes]
+
+
+def bump(*scopes):
+    """Сбрасывает закэшированные страницы указанных областей."""
+    generation = new_generation()
+    connection = store.connection
+    with connection:
+        connection.execute('BEGIN IMMEDIATE')
+        connection.executemany(BUMP_SQL,
+                               [(scope, generation) for scope in scopes])
+        # Страницы перерисуются и запомнят зависимости заново.
+        connection.executemany('DELETE FROM dependencies WHERE scope = ?',
+                               [(scope,) for scope in scopes])
+
+
+def depends_on(*scopes):
+    """Отмечает, что отрисовываемая страница показывает данные областей."""
+    scopes_shown = shown.get()
+    if scopes_shown is not None:
+        scopes_shown.update(scopes)
+
+
+def page_id(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def get_dependencies(request, scopes):
+    placeholders = ', '.join('?' * len(scopes))
+    return [dependency for dependency, in store.execute(
+        f'SELECT DISTINCT dependency FROM dependencies '
+        f'WHERE scope IN ({placeholders}) AND page = ? '
+        f'ORDER BY dependency', [*scopes, page_id(request)])]
+
+
+def save_dependencies(request, scopes, dependencies):
+    page = page_id(request)
+    connection = store.connection
+    with connection:
+        connection.execute('BEGIN IMMEDIATE')
+        connection.executemany(
+            'DELETE FROM dependencies WHERE scope = ? AND page = ?',
+            [(scope, page) for scope in scopes])
+        connection.executemany(
+            'INSERT INTO dependencies (scope, page, dependency) '
+            'VALUES (?, ?, ?)',
+            [(scope, page, dependency)
+             for scope in scopes for dependency in dependencies])
+
+
+def page_generations(request, scopes):
+    """Поколения областей страницы и показанных на ней областей.
+
+    Считаются один раз за запрос. После рендеринга cache_by_generation
+    заменяет их поколениями, которым соответствует ответ.
+    """
+    if not hasattr(request, 'page_generations'):
+        request.page_dependencies = get_dependencies(request, scopes)
+        request.page_generations = get_generations(
+            [*scopes, *request.page_dependencies])
+    return request.page_generations
+
+
+def render_page(request, scopes, view, *args, **kwargs):
+    """Вызывает view и обновляет зависимости страницы.
+
+    Возвращает ответ и поколения, под которыми его можно кэшировать,
+    или None, если показанная область менялась во время рендеринга.
+    """
+    generations = page_generations(request, scopes)
+    started = new_generation()
+    scopes_shown = set()
+    token = shown.set(scopes_shown)
+    try:
+        response = view(request, *args, **kwargs)
+    finally:
+        shown.reset(token)
+    dependencies = sorted(scopes_shown)
+    if dependencies == request.page_dependencies:
+        return response, generations
+    save_dependencies(request, scopes, dependencies)
+    shown_generations = get_generations(dependencies, first=started)
+    if any(generation > started for generation in shown_generations):
+        return response, None
+    request.page_dependencies = dependencies
+    request.page_generations = [*generations[:len(scopes)],
+                                *shown_generations]
+    return response, request.page_generations
+
+
+def page_key(request, generations, vary_on_csrf):
+    parts = [request.get_full_path(), str(request.user.pk)]
+    if vary_on_csrf:
+        parts.append(request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''))
+    digest = hashlib.md5('\n'.join(parts).encode()).hexdigest()
+    return PAGE_KEY.format(digest, '.'.join(map(str, generations)))
+
+
+def cache_by_generation(get_scopes, timeout=PAGE_CACHE_TIMEOUT,
+                        vary_on_csrf=False):
+    """Кэширует GET-ответы view до смены поколения любой из областей.
+
+    get_scopes принимает аргументы view и возвращает список областей.
+    Страницы с формами (vary_on_csrf=True) кэшируются отдельно для каждого
+    CSRF-cookie и не сохраняются, пока cookie у клиента ещё нет.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            scopes = get_scopes(*args, **kwargs)
+            generations = page_generations(request, scopes)
+            response = cache.get(page_key(request, generations, vary_on_csrf))
+            if response is not None:
+                return response
+            response, generations = render_page(request, scopes, view,
+                                                *args, **kwargs)
+            has_csrf_cookie = settings.CSRF_COOKIE_NAME in request.COOKIES
+            uses_csrf = request.META.get('CSRF_COOKIE_USED')
+            if (generations is not None
+                    and response.status_code == 200
+                    and (not uses_csrf or vary_on_csrf and has_csrf_cookie)
+                    and not replicas.may_be_stale(max(generations))):
+                cache.set(page_key(request, generations, vary_on_csrf),
+                          response, timeout)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,82 @@
+"""Условные GET-запросы (ETag / Last-Modified) для лент и поста.
+
+Валидаторы считаются без рендеринга шаблона и без запросов к БД: ETag
+строится из поколений кэша страницы (posts.caching), адреса и
+пользователя, а Last-Modified — из времени последней смены поколения,
+то есть последнего создания или изменения поста, комментария или
+подписки. Поколения общие для всех процессов сервера, поэтому любой
+процесс отвечает одинаково; у области, которая ещё не менялась,
+поколение — время первого обращения к ней, не раньше реального
+изменения. При совпадении клиент получает 304 без рендеринга.
+В поколения входят и области, показанные на странице (posts.caching):
+если они стали известны только при рендеринге, валидаторы ответа
+пересчитываются по ним.
+Страница с реплики, которая могла ещё не получить последнее изменение,
+отдаётся без валидаторов: иначе клиент подтверждал бы устаревшую копию.
+"""
+import hashlib
+from datetime import datetime
+from functools import wraps
+
+from django.utils.http import http_date
+from django.utils.http import quote_etag
+from django.utils.timezone import utc
+from django.views.decorators.http import condition
+
+from core import replicas
+from posts import caching
+
+
+def get_etag(request, generations):
+    if replicas.may_be_stale(max(generations)):
+        return None
+    parts = [request.get_full_path(), str(request.user.pk),
+             *map(str, generations)]
+    return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+
+def get_last_modified(generations):
+    if replicas.may_be_stale(max(generations)):
+        return None
+    return datetime.fromtimestamp(max(generations) / 10 ** 9, tz=utc)
+
+
+def make_etag(get_scopes):
+    def etag(request, *args, **kwargs):
+        return get_etag(request, caching.page_generations(
+            request, get_scopes(*args, **kwargs)))
+    return etag
+
+
+def make_last_modified(get_scopes):
+    def last_modified(request, *args, **kwargs):
+        return get_last_modified(caching.page_generations(
+            request, get_scopes(*args, **kwargs)))
+    return last_modified
+
+
+def conditional_page(get_scopes):
+    """Декоратор condition() с валидаторами по поколениям областей."""
+    conditional = condition(etag_func=make_etag(get_scopes),
+                            last_modified_func=make_last_modified(get_scopes))
+
+    def decorator(view):
+        @wraps(view)
+        def validated(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if (request.method not in ('GET', 'HEAD')
+                    or response.status_code != 200):
+                return response
+            # Поколения, которым соответствует ответ (после рендеринга).
+            generations = caching.page_generations(
+                request, get_scopes(*args, **kwargs))
+            etag = get_etag(request, generations)
+            if etag is not None:
+                response['ETag'] = quote_etag(etag)
+            last_modified = get_last_modified(generations)
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(
+                    last_modified.timestamp())
+            return response
+        return conditional(validated)
+    return decorator
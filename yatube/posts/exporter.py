@@ -0,0 +1,137 @@
+"""Потоковая выгрузка данных в JSONL или CSV.
+
+Таблицы читаются пачками по первичному ключу (WHERE id > последний
+ORDER BY id LIMIT chunk_size): в памяти одновременно только одна пачка,
+и между пачками не держится открытая транзакция чтения, даже если
+клиент забирает ответ медленно. Каждая пачка превращается в один кусок
+вывода; gzip сжимает куски по мере появления.
+
+JSONL совпадает с форматом posts/importer.py, так что выгрузку можно
+загрузить обратно командой yatube_import. Пароли и почта пользователей
+не выгружаются. CSV — одна таблица на файл, с заголовком.
+"""
+import csv
+import io
+import json
+import zlib
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.settings import EXPORT_CHUNK_SIZE
+
+# Тип объекта: (модель, [(поле в выгрузке, поле в values())]).
+KINDS = {
+    'user': (User, [('username', 'username'),
+                    ('first_name', 'first_name'),
+                    ('last_name', 'last_name')]),
+    'group': (Group, [('slug', 'slug'),
+                      ('title', 'title'),
+                      ('description', 'description')]),
+    'post': (Post, [('id', 'pk'),
+                    ('author', 'author__username'),
+                    ('text', 'text'),
+                    ('pub_date', 'pub_date'),
+                    ('group', 'group__slug'),
+                    ('image', 'image')]),
+    'comment': (Comment, [('id', 'pk'),
+                          ('post', 'post_id'),
+                          ('author', 'author__username'),
+                          ('text', 'text'),
+                          ('created', 'created')]),
+    'follow': (Follow, [('user', 'user__username'),
+                        ('author', 'author__username')]),
+}
+FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+class ExportError(ValueError):
+    pass
+
+
+def batches(kind, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки таблицы пачками по chunk_size, по возрастанию id."""
+    model, columns = KINDS[kind]
+    lookups = [lookup for _, lookup in columns]
+    names = [name for name, _ in columns]
+    last_pk = 0
+    while True:
+        rows = list(model.objects
+                    .filter(pk__gt=last_pk)
+                    .order_by('pk')
+                    .values_list('pk', *lookups)[:chunk_size])
+        if not rows:
+            return
+        last_pk = rows[-1][0]
+        yield [dict(zip(names, map(to_text, row[1:]))) for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+
+def to_text(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def render_jsonl(kinds, chunk_size):
+    for kind in kinds:
+        for rows in batches(kind, chunk_size):
+            yield ''.join(
+                json.dumps({'type': kind, **row}, ensure_ascii=False) + '\n'
+                for row in rows)
+
+
+def render_csv(kind, chunk_size):
+    names = [name for name, _ in KINDS[kind][1]]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, names)
+    writer.writeheader()
+    for rows in batches(kind, chunk_size):
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        # Пустая таблица: остался только заголовок.
+        yield buffer.getvalue()
+
+
+def compress(chunks):
+    """Сжимает поток кусков в gzip, не собирая его целиком."""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(kinds=None, fmt='jsonl', gzip=False,
+           chunk_size=EXPORT_CHUNK_SIZE):
+    """Итератор байтов выгрузки указанных (или всех) таблиц."""
+    kinds = list(kinds or KINDS)
+    unknown = set(kinds) - KINDS.keys()
+    if unknown:
+        raise ExportError(
+            f'Неизвестные таблицы: {", ".join(sorted(unknown))}')
+    if fmt == 'jsonl':
+        chunks = render_jsonl(kinds, chunk_size)
+    elif fmt == 'csv':
+        if len(kinds) != 1:
+            raise ExportError('CSV выгружает ровно одну таблицу')
+        chunks = render_csv(kinds[0], chunk_size)
+    else:
+        raise ExportError(f'Неизвестный формат: {fmt}')
+    chunks = (chunk.encode() for chunk in chunks)
+    return compress(chunks) if gzip else chunks
+
+
+def filename(kinds, fmt, gzip=False):
+    name = f'yatube-{"-".join(kinds) if kinds else "all"}.{fmt}'
+    return f'{name}.gz' if gzip else name
@@ -1,4 +1,8 @@
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
+from posts import images
 from posts.models import Comment
 from posts.models import Post
 
@@ -14,6 +18,31 @@ class PostForm(ModelForm):
             'text': 'Hапишите свой пост здесь',
             'group': 'Выберите сообщество'}
 
+    def clean_image(self):
+        image = self.cleaned_data['image']
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return images.ingest(image)
+        except (OSError, ValueError):
+            raise ValidationError('Не удалось обработать картинку')
+
+    # Файл, созданный последним save, — его удаляют, если запись поста
+    # не зафиксировалась (images.discard).
+    created_image = None
+
+    def save(self, commit=True):
+        image = self.cleaned_data.get('image')
+        if not isinstance(image, ContentFile):
+            return super().save(commit)
+        # Одинаковые картинки хранятся одним файлом. Он пишется после
+        # ссылки на него (сигналы Post), в той же транзакции.
+        self.instance.image = image.name
+        post = super().save(commit)
+        if images.store(image):
+            self.created_image = image.name
+        return post
+
 
 class CommentForm(ModelForm):
     class Meta:
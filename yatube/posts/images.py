@@ -0,0 +1,157 @@
+"""Приём картинок постов: пережатие и хранение по хэшу содержимого.
+
+Загруженная картинка уменьшается до IMAGE_MAX_SIZE, теряет метаданные
+(EXIF, ICC и т. п.) и пережимается в WEBP, а если Pillow собран без
+него — в JPEG или, для картинок с прозрачностью, в PNG. Файл хранится
+под именем posts/<xx>/<sha256>.<ext>, поэтому одинаковые картинки разных
+постов — один файл. Сколько постов ссылается на файл, хранит ImageBlob
+(счётчик меняют сигналы Post); файл без ссылок удаляется вместе с
+миниатюрами после фиксации транзакции.
+
+Файл пишется в той же транзакции, что и ссылка на него, а удаляется
+под блокировкой записи (core.writes): загрузка той же картинки либо
+успевает сослаться на файл до удаления, либо записывает его заново.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+from io import BytesIO
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
+from django.db import transaction
+from django.db.models import Count
+from django.db.models import F
+from PIL import features
+from PIL import Image
+from PIL import ImageOps
+from sorl import thumbnail
+
+from core import writes
+from posts.models import ImageBlob
+from posts.models import Post
+from posts.settings import IMAGE_MAX_SIZE
+from posts.settings import IMAGE_QUALITY
+
+UPLOAD_DIR = 'posts'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+logger = logging.getLogger(__name__)
+
+
+def has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+
+
+def output_format(alpha):
+    if features.check('webp'):
+        return 'WEBP'
+    return 'PNG' if alpha else 'JPEG'
+
+
+def ingest(upload):
+    """Пережимает загруженную картинку.
+
+    Возвращает ContentFile с именем по хэшу результата; сам файл
+    сохраняет store().
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    # JPEG уменьшается ещё при декодировании — так в разы быстрее.
+    image.draft('RGB', (IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+    image = ImageOps.exif_transpose(image)
+    alpha = has_alpha(image)
+    image = image.convert('RGBA' if alpha else 'RGB')
+    image.thumbnail((IMAGE_MAX_SIZE, IMAGE_MAX_SIZE), Image.LANCZOS)
+    image.info = {}
+    format = output_format(alpha)
+    buffer = BytesIO()
+    image.save(buffer, format, quality=IMAGE_QUALITY, optimize=True)
+    data = buffer.getvalue()
+    digest = hashlib.sha256(data).hexdigest()
+    name = f'{UPLOAD_DIR}/{digest[:2]}/{digest}.{EXTENSIONS[format]}'
+    return ContentFile(data, name=name)
+
+
+def store(content):
+    """Сохраняет файл, если такого ещё нет; True — файл создан.
+
+    Файл пишется во временный рядом и получает своё имя ссылкой
+    (os.link): он появляется только целиком, а файл с тем же именем,
+    записанный параллельным запросом, — та же картинка и не заменяется.
+    """
+    path = default_storage.path(content.name)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory, prefix='.')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            for chunk in content.chunks():
+                file.write(chunk)
+        os.chmod(temporary, default_storage.file_permissions_mode or 0o644)
+        os.link(temporary, path)
+    except FileExistsError:
+        return False
+    finally:
+        os.remove(temporary)
+    return True
+
+
+def discard(name):
+    """Удаляет файл, созданный для незафиксированной записи поста."""
+    def delete():
+        if not ImageBlob.objects.filter(name=name).exists():
+            default_storage.delete(name)
+    writes.run('image_discard', delete)
+
+
+def retain(name):
+    """Добавляет ссылку на файл."""
+    if not name:
+        return
+    if ImageBlob.objects.filter(name=name).update(refs=F('refs') + 1):
+        return
+    try:
+        with transaction.atomic():
+            ImageBlob.objects.create(name=name, refs=1)
+    except IntegrityError:
+        ImageBlob.objects.filter(name=name).update(refs=F('refs') + 1)
+
+
+def release(name):
+    """Убирает ссылку на файл; последний освобождённый файл удаляется."""
+    if not name:
+        return
+    ImageBlob.objects.filter(name=name, refs__gt=0).update(
+        refs=F('refs') - 1)
+    transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    def delete():
+        deleted, _ = ImageBlob.objects.filter(name=name, refs=0).delete()
+        if not deleted:
+            return
+        try:
+            thumbnail.delete(name)
+        except SuspiciousFileOperation:
+            # Старые записи могут ссылаться на файлы вне MEDIA_ROOT.
+            logger.warning('Файл %s вне хранилища, не удалён', name)
+    writes.run('image_collect', delete)
+
+
+def reconcile(names, batch_size=500):
+    """Пересчитывает по постам ссылки на указанные файлы."""
+    names = sorted(set(names))
+    for start in range(0, len(names), batch_size):
+        batch = names[start:start + batch_size]
+        refs = (Post.objects.filter(image__in=batch)
+                .values_list('image')
+                .annotate(total=Count('pk'))
+                .order_by())
+        ImageBlob.objects.filter(name__in=batch).delete()
+        ImageBlob.objects.bulk_create(
+            ImageBlob(name=name, refs=total) for name, total in refs)
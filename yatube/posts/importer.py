@@ -0,0 +1,296 @@
+"""Массовая загрузка пользователей, групп, постов, комментариев и подписок.
+
+Вход — JSONL, по объекту на строку; тип объекта задаёт поле "type":
+
+  {"type": "user", "username": "leo", "first_name": "", "last_name": "",
+   "email": "", "password": "<хэш Django или пусто>"}
+  {"type": "group", "slug": "cats", "title": "Коты", "description": ""}
+  {"type": "post", "id": 17, "author": "leo", "text": "...",
+   "pub_date": "2020-01-01T10:00:00+03:00", "group": "cats",
+   "image": "posts/..."}
+  {"type": "comment", "post": 17, "author": "leo", "text": "...",
+   "created": "2020-01-02T08:00:00+03:00"}
+  {"type": "follow", "user": "leo", "author": "kate"}
+
+Пользователи и группы ищутся по username и slug: существующие не
+создаются заново. "id" поста — идентификатор из старой системы, на него
+ссылаются комментарии того же файла. Строки копятся по типам и
+сохраняются через bulk_create порциями по chunk_size строк, каждая — в
+своей транзакции; порция пишется в порядке зависимостей, поэтому
+комментарий может идти в файле раньше своего поста, если они попали
+в одну порцию.
+
+id новых постов выдаются заранее, от Max(pk) + 1, поэтому транзакция
+порции в SQLite начинается с BEGIN IMMEDIATE (core.writes): запись
+сайта ждёт конца порции и не займёт выданные id. В других СУБД такой
+блокировки нет — там загрузку запускают при остановленной записи.
+
+bulk_create не вызывает save() и сигналы, а на время загрузки обработчики
+ещё и отключены (signals.suspended), поэтому ленты, счётчики, ссылки
+на картинки и поколения кэша пересобирает rebuild() после загрузки.
+"""
+import json
+import time
+from datetime import datetime
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import writes
+from posts import bulk
+from posts import caching
+from posts import images
+from posts import signals
+from posts import stats
+from posts import timeline
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+KINDS = ('user', 'group', 'post', 'comment', 'follow')
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def parse(lines):
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            raise ImportFormatError(f'Строка {number}: ожидается объект')
+        yield row
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    if isinstance(value, datetime):
+        return value
+    date = parse_datetime(value)
+    if date is None:
+        raise ImportFormatError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+@contextmanager
+def explicit_dates():
+    """Даёт bulk_create сохранить даты из файла вместо текущего времени."""
+    fields = [Post._meta.get_field('pub_date'),
+              Post._meta.get_field('updated'),
+              Comment._meta.get_field('created')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Importer:
+    def __init__(self, batch_size=1000, chunk_size=10000):
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.pending = {kind: [] for kind in KINDS}
+        self.user_ids = {}
+        self.group_ids = {}
+        self.post_ids = {}
+        self.loaded = Counter()
+        self.skipped = Counter()
+        # Что затронула загрузка — для rebuild().
+        self.touched_users = set()
+        self.touched_groups = set()
+        self.post_authors = set()
+        self.followers = set()
+        self.image_names = set()
+
+    def load(self, lines):
+        """Загружает строки JSONL; возвращает кол-во прочитанных объектов."""
+        return self.load_rows(parse(lines))
+
+    def load_rows(self, rows):
+        """Загружает объекты-словари с полем "type"; возвращает их кол-во."""
+        total = 0
+        with signals.suspended(), explicit_dates():
+            for row in rows:
+                row = dict(row)
+                kind = row.pop('type', None)
+                if kind not in self.pending:
+                    raise ImportFormatError(f'Неизвестный тип: {kind}')
+                self.pending[kind].append(row)
+                total += 1
+                if total % self.chunk_size == 0:
+                    self.flush()
+            self.flush()
+        return total
+
+    def flush(self):
+        try:
+            with writes.write('import'):
+                for kind in KINDS:
+                    rows, self.pending[kind] = self.pending[kind], []
+                    if rows:
+                        getattr(self, f'load_{kind}s')(rows)
+        except KeyError as error:
+            raise ImportFormatError(f'Нет обязательного поля {error}')
+
+    def remember_users(self, usernames):
+        missing = set(usernames) - self.user_ids.keys()
+        if missing:
+            self.user_ids.update(User.objects.filter(
+                username__in=missing).values_list('username', 'pk'))
+
+    def remember_groups(self, slugs):
+        missing = set(slugs) - self.group_ids.keys()
+        if missing:
+            self.group_ids.update(Group.objects.filter(
+                slug__in=missing).values_list('slug', 'pk'))
+
+    def load_users(self, rows):
+        self.remember_users(row['username'] for row in rows)
+        users = [
+            User(username=row['username'],
+                 first_name=row.get('first_name', ''),
+                 last_name=row.get('last_name', ''),
+                 email=row.get('email', ''),
+                 password=row.get('password') or make_password(None))
+            for row in rows if row['username'] not in self.user_ids
+        ]
+        bulk.bulk_create(User, users, batch_size=self.batch_size,
+                         ignore_conflicts=True)
+        self.remember_users(user.username for user in users)
+        self.touched_users.update(self.user_ids[user.username]
+                                  for user in users)
+        self.loaded['user'] += len(users)
+        self.skipped['user'] += len(rows) - len(users)
+
+    def load_groups(self, rows):
+        self.remember_groups(row['slug'] for row in rows)
+        groups = [
+            Group(slug=row['slug'], title=row['title'],
+                  description=row.get('description', ''))
+            for row in rows if row['slug'] not in self.group_ids
+        ]
+        bulk.bulk_create(Group, groups, batch_size=self.batch_size,
+                         ignore_conflicts=True)
+        self.remember_groups(group.slug for group in groups)
+        self.loaded['group'] += len(groups)
+        self.skipped['group'] += len(rows) - len(groups)
+
+    def load_posts(self, rows):
+        self.remember_users(row['author'] for row in rows)
+        self.remember_groups(row['group'] for row in rows if row.get('group'))
+        # SQLite не возвращает id из bulk_create, поэтому id выдаются
+        # заранее (под блокировкой записи, см. flush): на них ссылаются
+        # комментарии из файла.
+        next_pk = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        posts = []
+        for row in rows:
+            author_id = self.user_ids.get(row['author'])
+            if author_id is None:
+                continue
+            pub_date = parse_date(row.get('pub_date'))
+            post = Post(pk=next_pk + len(posts),
+                        author_id=author_id,
+                        group_id=self.group_ids.get(row.get('group')),
+                        text=row['text'],
+                        pub_date=pub_date,
+                        updated=pub_date,
+                        image=row.get('image') or '')
+            if 'id' in row:
+                self.post_ids[row['id']] = post.pk
+            if post.image:
+                self.image_names.add(post.image.name)
+            if row.get('group') in self.group_ids:
+                self.touched_groups.add(row['group'])
+            self.post_authors.add(author_id)
+            posts.append(post)
+        bulk.bulk_create(Post, posts, batch_size=self.batch_size)
+        self.loaded['post'] += len(posts)
+        self.skipped['post'] += len(rows) - len(posts)
+
+    def load_comments(self, rows):
+        self.remember_users(row['author'] for row in rows)
+        comments = [
+            Comment(post_id=self.post_ids[row['post']],
+                    author_id=self.user_ids[row['author']],
+                    text=row['text'],
+                    created=parse_date(row.get('created')))
+            for row in rows
+            if row['post'] in self.post_ids and row['author'] in self.user_ids
+        ]
+        bulk.bulk_create(Comment, comments, batch_size=self.batch_size)
+        self.loaded['comment'] += len(comments)
+        self.skipped['comment'] += len(rows) - len(comments)
+
+    def load_follows(self, rows):
+        self.remember_users(name for row in rows
+                            for name in (row['user'], row['author']))
+        follows = [
+            Follow(user_id=self.user_ids[row['user']],
+                   author_id=self.user_ids[row['author']])
+            for row in rows
+            if row['user'] in self.user_ids
+            and row['author'] in self.user_ids
+            and row['user'] != row['author']
+        ]
+        bulk.bulk_create(Follow, follows, batch_size=self.batch_size,
+                         ignore_conflicts=True)
+        for follow in follows:
+            self.followers.add(follow.user_id)
+            self.touched_users.update((follow.user_id, follow.author_id))
+        self.loaded['follow'] += len(follows)
+        self.skipped['follow'] += len(rows) - len(follows)
+
+    def rebuild(self):
+        """Пересобирает производные данные для затронутых объектов."""
+        followers = set(self.followers)
+        authors = sorted(self.post_authors)
+        for start in range(0, len(authors), self.batch_size):
+            followers.update(Follow.objects.filter(
+                author_id__in=authors[start:start + self.batch_size]
+            ).values_list('user_id', flat=True))
+        users = self.touched_users | self.post_authors
+        stats.reconcile(sorted(users), self.batch_size)
+        timeline.rebuild(sorted(followers))
+        images.reconcile(self.image_names)
+        usernames = {pk: name for name, pk in self.user_ids.items()}
+        caching.bump(
+            caching.posts_scope(),
+            *(caching.group_scope(slug) for slug in self.touched_groups),
+            *(caching.author_scope(usernames[pk]) for pk in users
+              if pk in usernames),
+        )
+
+
+def run(lines, batch_size=1000, chunk_size=10000):
+    """Загружает строки JSONL и пересобирает производные данные.
+
+    Возвращает (Importer, время загрузки, время пересборки) в секундах.
+    """
+    return run_rows(parse(lines), batch_size, chunk_size)
+
+
+def run_rows(rows, batch_size=1000, chunk_size=10000):
+    """То же, что run(), для готовых объектов-словарей."""
+    importer = Importer(batch_size, chunk_size)
+    started = time.perf_counter()
+    importer.load_rows(rows)
+    loaded = time.perf_counter()
+    importer.rebuild()
+    return importer, loaded - started, time.perf_counter() - loaded
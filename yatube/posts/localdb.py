@@ -0,0 +1,42 @@
+"""Локальные файлы SQLite рядом с приложением (не основная БД).
+
+В таких файлах лежат служебные данные, общие для всех процессов сервера
+на одной машине: метаданные миниатюр, индекс дискового кэша картинок.
+Файл открывается в режиме WAL, чтобы чтение не ждало записи.
+"""
+import os
+import sqlite3
+import threading
+
+
+class LocalDatabase:
+    """Соединения с файлом SQLite, по одному на поток.
+
+    get_path вызывается при каждом обращении, поэтому путь можно менять
+    в тестах через override_settings. После fork соединения открываются
+    заново.
+    """
+
+    def __init__(self, get_path, *schema):
+        self.get_path = get_path
+        self.schema = schema
+        self._local = threading.local()
+
+    @property
+    def connection(self):
+        path = self.get_path()
+        key = (os.getpid(), path)
+        connection = getattr(self._local, 'connections', {}).get(key)
+        if connection is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            connection = sqlite3.connect(path, timeout=10,
+                                         isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for sql in self.schema:
+                connection.execute(sql)
+            self._local.connections = {key: connection}
+        return connection
+
+    def execute(self, sql, params=()):
+        return self.connection.execute(sql, params)
@@ -0,0 +1,91 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import KVStore
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from posts.kvstore import SQLiteKVStore
+from posts.settings import POSTS_PER_PAGE
+
+PREFIX = 'bench-kvstore'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск метаданных миниатюр для страницы ленты '
+            'в стандартном хранилище sorl (БД + кэш) и в файле SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keys', type=int, default=10_000)
+        parser.add_argument('--pages', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        image_files = []
+        for number in range(options['keys']):
+            image_file = ImageFile(f'{PREFIX}/{number}.jpg')
+            image_file.set_size((960, 640))
+            image_files.append(image_file)
+        pages = [rng.sample(image_files, POSTS_PER_PAGE)
+                 for _ in range(options['pages'])]
+        db_store = KVStore()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'thumbnails.sqlite3')
+            with override_settings(THUMBNAIL_KVSTORE_PATH=path):
+                sqlite_store = SQLiteKVStore()
+                try:
+                    results = self.run_cases(
+                        db_store, sqlite_store, image_files, pages)
+                finally:
+                    KVStoreModel.objects.filter(
+                        key__contains=f'||{PREFIX}').delete()
+                    self.forget(db_store, image_files)
+        self.stdout.write(f'Записей: {options["keys"]}, '
+                          f'страниц по {POSTS_PER_PAGE} карточек: '
+                          f'{options["pages"]}')
+        for name, elapsed in results.items():
+            self.stdout.write(f'{name}: {elapsed * 1e6:.0f} мкс на страницу')
+
+    def run_cases(self, db_store, sqlite_store, image_files, pages):
+        started = time.perf_counter()
+        for store in (db_store, sqlite_store):
+            for image_file in image_files:
+                store.set(image_file)
+        self.stdout.write(
+            f'Данные подготовлены за {time.perf_counter() - started:.1f} с')
+
+        def db_lookup(page):
+            return [db_store.get(image_file) for image_file in page]
+
+        return {
+            # Как в только что запущенном процессе с LocMemCache.
+            'БД + кэш, холодный кэш': self.measure(
+                pages, db_lookup,
+                prepare=lambda page: self.forget(db_store, page)),
+            'БД + кэш, тёплый кэш': self.measure(
+                pages, db_lookup, prepare=db_lookup),
+            'SQLite-файл, по одной записи': self.measure(
+                pages, lambda page: [sqlite_store.get(f) for f in page]),
+            'SQLite-файл, вся страница сразу': self.measure(
+                pages, sqlite_store.get_many),
+        }
+
+    def forget(self, db_store, image_files):
+        db_store.cache.delete_many([add_prefix(image_file.key)
+                                    for image_file in image_files])
+
+    def measure(self, pages, lookup, prepare=None):
+        elapsed = 0
+        for page in pages:
+            if prepare is not None:
+                prepare(page)
+            started = time.perf_counter()
+            lookup(page)
+            elapsed += time.perf_counter() - started
+        return elapsed / len(pages)
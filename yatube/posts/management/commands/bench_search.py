@@ -0,0 +1,81 @@
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import to_match
+
+WORDS = 20000
+WORDS_PER_TEXT = 30
+FTS_WHERE = 'FROM posts_post_fts WHERE posts_post_fts MATCH ?'
+CASES = (
+    ('LIKE, первая страница',
+     'SELECT id FROM posts_post WHERE text LIKE ? LIMIT 10',
+     lambda word: f'%{word}%'),
+    ('LIKE, подсчёт совпадений',
+     'SELECT count(*) FROM posts_post WHERE text LIKE ?',
+     lambda word: f'%{word}%'),
+    ('FTS5, первая страница по bm25',
+     f'SELECT rowid {FTS_WHERE} ORDER BY bm25(posts_post_fts) LIMIT 10',
+     to_match),
+    ('FTS5, подсчёт совпадений',
+     f'SELECT count(*) {FTS_WHERE}',
+     to_match),
+)
+
+
+def make_word(rng):
+    return ''.join(rng.choice('абвгдеёжзийклмнопрстуфхцчшщыэюя')
+                   for _ in range(rng.randint(3, 10)))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск через FTS5 и LIKE-скан на синтетической '
+            'таблице во временной базе SQLite.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = [make_word(rng) for _ in range(WORDS)]
+        with tempfile.TemporaryDirectory() as directory:
+            db = sqlite3.connect(os.path.join(directory, 'bench.sqlite3'))
+            self.fill(db, rng, vocabulary, options['rows'])
+            words = rng.sample(vocabulary, options['queries'])
+            results = {
+                name: self.measure(db, words, sql, to_param)
+                for name, sql, to_param in CASES
+            }
+            db.close()
+        self.stdout.write(f'Строк: {options["rows"]}, '
+                          f'запросов: {options["queries"]}')
+        for name, elapsed in results.items():
+            self.stdout.write(f'{name}: {elapsed * 1000:.2f} мс на запрос')
+
+    def fill(self, db, rng, vocabulary, rows):
+        started = time.perf_counter()
+        db.execute('CREATE TABLE posts_post ('
+                   'id INTEGER PRIMARY KEY, text TEXT NOT NULL)')
+        db.execute("CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+                   "text, content='posts_post', content_rowid='id')")
+        db.executemany(
+            'INSERT INTO posts_post (text) VALUES (?)',
+            ((' '.join(rng.choices(vocabulary, k=WORDS_PER_TEXT)),)
+             for _ in range(rows)))
+        db.execute("INSERT INTO posts_post_fts(posts_post_fts) "
+                   "VALUES ('rebuild')")
+        db.commit()
+        self.stdout.write(
+            f'Данные подготовлены за {time.perf_counter() - started:.1f} с')
+
+    def measure(self, db, words, sql, to_param):
+        started = time.perf_counter()
+        for word in words:
+            db.execute(sql, [to_param(word)]).fetchall()
+        return (time.perf_counter() - started) / len(words)
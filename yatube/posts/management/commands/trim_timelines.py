@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из лент подписок записи сверх TIMELINE_MAX_SIZE '
+            '(запускать периодически, например из cron).')
+
+    def handle(self, *args, **options):
+        deleted = timeline.trim()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей ленты: {deleted}'))
@@ -0,0 +1,61 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from posts import exporter
+from posts.settings import EXPORT_CHUNK_SIZE
+
+
+class Command(BaseCommand):
+    help = ('Выгружает таблицы в JSONL или CSV пачками, не загружая их '
+            'в память целиком.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл или - для stdout')
+        parser.add_argument(
+            '--kind', action='append', choices=list(exporter.KINDS),
+            help='Таблица для выгрузки (можно несколько; по умолчанию все)'
+        )
+        parser.add_argument(
+            '--format', choices=list(exporter.FORMATS), default='jsonl'
+        )
+        parser.add_argument(
+            '--gzip', action='store_true',
+            help='Сжимать gzip (включается сам для файла *.gz)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Сколько строк читать за один запрос'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            chunks = exporter.stream(
+                options['kind'], options['format'],
+                gzip=options['gzip'] or path.endswith('.gz'),
+                chunk_size=options['chunk_size'])
+        except exporter.ExportError as error:
+            raise CommandError(error)
+        started = time.perf_counter()
+        written = 0
+        if path == '-':
+            output = sys.stdout.buffer
+        else:
+            try:
+                output = open(path, 'wb')
+            except OSError as error:
+                raise CommandError(error)
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+                written += len(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        if path != '-':
+            self.stdout.write(self.style.SUCCESS(
+                f'Записано {written} байт за '
+                f'{time.perf_counter() - started:.1f} с'))
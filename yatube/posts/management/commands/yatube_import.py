@@ -0,0 +1,47 @@
+import sys
+from contextlib import nullcontext
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+
+from posts import importer
+
+
+class Command(BaseCommand):
+    help = ('Загружает пользователей, группы, посты, комментарии и подписки '
+            'из JSONL (формат описан в posts/importer.py).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL или - для stdin')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=10000,
+            help='Сколько строк сохранять в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        if options['path'] == '-':
+            # stdin открыла не команда — и закрывать его не ей.
+            source = nullcontext(sys.stdin)
+        else:
+            try:
+                source = open(options['path'], encoding='utf-8')
+            except OSError as error:
+                raise CommandError(error)
+        try:
+            with source as lines:
+                loader, load_time, rebuild_time = importer.run(
+                    lines, options['batch_size'], options['chunk_size'])
+        except importer.ImportFormatError as error:
+            raise CommandError(error)
+        for kind in importer.KINDS:
+            self.stdout.write(f'{kind}: загружено {loader.loaded[kind]}, '
+                              f'пропущено {loader.skipped[kind]}')
+        total = sum(loader.loaded.values()) + sum(loader.skipped.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {total} за {load_time:.1f} с '
+            f'({total / max(load_time, 1e-9):.0f} строк/с); '
+            f'производные данные пересобраны за {rebuild_time:.1f} с'))
@@ -0,0 +1,90 @@
+from datetime import datetime
+from datetime import time as day_start
+
+from django.core.management.base import BaseCommand
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from posts import importer
+from posts import seed
+
+
+def parse_day(value):
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError as error:
+        raise CommandError(error)
+    return timezone.make_aware(day)
+
+
+class Command(BaseCommand):
+    help = ('Создаёт синтетических пользователей, посты, подписки и '
+            'комментарии для проверки на больших объёмах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--follows-per-user', type=int, default=20)
+        parser.add_argument(
+            '--comments-per-post', type=float, default=1.0,
+            help='Среднее кол-во комментариев к посту'
+        )
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument(
+            '--group-share', type=float, default=0.3,
+            help='Доля постов в группах'
+        )
+        parser.add_argument(
+            '--image-share', type=float, default=0.2,
+            help='Доля постов с картинкой'
+        )
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных картинок сгенерировать'
+        )
+        parser.add_argument(
+            '--alpha', type=float, default=1.0,
+            help='Показатель степенного закона популярности авторов'
+        )
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней до --until распределить посты'
+        )
+        parser.add_argument(
+            '--until', type=parse_day,
+            help='Дата последнего поста, ГГГГ-ММ-ДД (по умолчанию сегодня)'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix', default='user',
+            help='Префикс имён пользователей и групп'
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь')
+        if options['posts'] < 0:
+            raise CommandError('Число постов не может быть отрицательным')
+        until = options['until'] or timezone.make_aware(
+            datetime.combine(timezone.localdate(), day_start()))
+        rows = seed.rows(
+            options['users'], options['posts'], options['follows_per_user'],
+            until, seed=options['seed'], alpha=options['alpha'],
+            days=options['days'], groups=options['groups'],
+            group_share=options['group_share'],
+            image_share=options['image_share'],
+            image_pool=options['images'],
+            comments_per_post=options['comments_per_post'],
+            prefix=options['prefix'])
+        loader, load_time, rebuild_time = importer.run_rows(
+            rows, options['batch_size'], options['chunk_size'])
+        for kind in importer.KINDS:
+            self.stdout.write(f'{kind}: создано {loader.loaded[kind]}, '
+                              f'пропущено {loader.skipped[kind]}')
+        total = sum(loader.loaded.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Строк: {total} за {load_time:.1f} с '
+            f'({total / max(load_time, 1e-9):.0f} строк/с); '
+            f'производные данные пересобраны за {rebuild_time:.1f} с'))
@@ -0,0 +1,61 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# TIMELINE_MAX_SIZE на момент миграции.
+TIMELINE_MAX_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """Ленты существующих подписчиков: последние посты их авторов."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    schema_editor.execute(
+        f'INSERT INTO {TimelineEntry._meta.db_table} '
+        f'(user_id, post_id, pub_date) '
+        f'SELECT user_id, post_id, pub_date FROM ('
+        f'SELECT follow.user_id, post.id AS post_id, post.pub_date, '
+        f'ROW_NUMBER() OVER (PARTITION BY follow.user_id '
+        f'ORDER BY post.pub_date DESC, post.id DESC) AS position '
+        f'FROM {Follow._meta.db_table} AS follow '
+        f'JOIN {Post._meta.db_table} AS post '
+        f'ON post.author_id = follow.author_id) AS feed '
+        f'WHERE feed.position <= %s',
+        [TIMELINE_MAX_SIZE])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0008_auto_20211125_1719'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ('-pub_date',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date'], name='timeline_user_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
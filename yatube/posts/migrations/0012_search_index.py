@@ -0,0 +1,45 @@
+from django.db import migrations
+
+TABLES = ('posts_post', 'posts_comment')
+
+
+def create_sql(table):
+    return [
+        f"CREATE VIRTUAL TABLE {table}_fts USING fts5("
+        f"text, content='{table}', content_rowid='id')",
+        f"CREATE TRIGGER {table}_fts_insert AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+        f"CREATE TRIGGER {table}_fts_delete AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"END",
+        f"CREATE TRIGGER {table}_fts_update AFTER UPDATE OF text ON {table} "
+        f"BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+        f"INSERT INTO {table}_fts({table}_fts) VALUES ('rebuild')",
+    ]
+
+
+def drop_sql(table):
+    return [
+        f"DROP TRIGGER IF EXISTS {table}_fts_insert",
+        f"DROP TRIGGER IF EXISTS {table}_fts_delete",
+        f"DROP TRIGGER IF EXISTS {table}_fts_update",
+        f"DROP TABLE IF EXISTS {table}_fts",
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunSQL(create_sql(table), drop_sql(table))
+        for table in TABLES
+    ]
@@ -0,0 +1,155 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.paginator import Page
+from django.core.paginator import Paginator
+from django.db.models import F
+from django.db.models import Max
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+from posts.settings import PAGE_NUMBER_LIMIT
+
+
+def encode_cursor(value, pk, number):
+    """Упаковывает позицию в ленте в непрозрачный токен для URL."""
+    payload = json.dumps([value.isoformat(), pk, number]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен; для испорченного токена возвращает None."""
+    try:
+        payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        value, pk, number = json.loads(payload)
+        return datetime.fromisoformat(value), int(pk), max(int(number), 1)
+    except (binascii.Error, TypeError, ValueError):
+        return None
+
+
+class KeysetPaginator(Paginator):
+    """Паджинатор по ключу (key_field, id) без COUNT(*) и OFFSET.
+
+    Соседние страницы открываются по токенам ?after=/?before=, а первые
+    PAGE_NUMBER_LIMIT страниц по-прежнему доступны по ?page=N. Значение
+    ключа читается из одноимённого атрибута объектов страницы.
+
+    pk_field — второй ключ сортировки, равный pk объектов (для ленты
+    через связанную таблицу — её ссылка на объект, чтобы порядок целиком
+    брался из одного индекса). filters накладываются в одном filter()
+    с условием курсора: условия по многозначной связи в разных filter()
+    дали бы лишний JOIN.
+    """
+
+    def __init__(self, object_list, per_page, key_field='pub_date',
+                 pk_field='pk', filters=None):
+        super().__init__(object_list, per_page)
+        self.key_field = key_field
+        self.key_attr = key_field.split('__')[-1]
+        self.pk_field = pk_field
+        self.filters = filters or {}
+        self.number = 1
+        self.has_next = False
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self.has_next else self.number
+
+    @cached_property
+    def window(self):
+        """Номера страниц, на которые можно сослаться через ?page=N."""
+        limit = self.per_page * PAGE_NUMBER_LIMIT + 1
+        # COUNT(*) по срезу строит подзапрос с сортировкой во временном
+        # B-дереве; id по индексу ленты читаются без неё.
+        count = len(self.ordered().values_list('pk', flat=True)[:limit])
+        pages = min(-(-count // self.per_page), PAGE_NUMBER_LIMIT)
+        return range(1, max(pages, 1) + 1)
+
+    def ordered(self, descending=True, *conditions):
+        # F(), а не строка: order_by('связь__fk') сортировал бы по
+        # Meta.ordering связанной модели через ещё один JOIN.
+        direction = 'desc' if descending else 'asc'
+        return self.object_list.filter(*conditions, **self.filters).order_by(
+            getattr(F(self.key_field), direction)(),
+            getattr(F(self.pk_field), direction)())
+
+    def keyset(self, value, pk, lookup):
+        """(key, pk) строго за курсором в сторону lookup (lt или gt).
+
+        Лишнее условие key <= value (>=) даёт SQLite диапазон по индексу:
+        одно OR индекс не использует.
+        """
+        bound = 'lte' if lookup == 'lt' else 'gte'
+        return (Q(**{f'{self.key_field}__{bound}': value})
+                & (Q(**{f'{self.key_field}__{lookup}': value})
+                   | Q(**{f'{self.pk_field}__{lookup}': pk})))
+
+    def get_page(self, params):
+        """Возвращает страницу по параметрам запроса after/before/page."""
+        for direction in ('after', 'before'):
+            cursor = decode_cursor(params.get(direction, ''))
+            if cursor is not None:
+                return getattr(self, f'page_{direction}')(*cursor)
+        try:
+            number = int(params.get('page', 1))
+        except (TypeError, ValueError):
+            number = 1
+        return self.page_number(min(max(number, 1), PAGE_NUMBER_LIMIT))
+
+    def page_number(self, number):
+        if number > 1:
+            number = min(number, self.window[-1])
+        offset = (number - 1) * self.per_page
+        rows = list(self.ordered()[offset:offset + self.per_page + 1])
+        return self.build_page(rows, number)
+
+    def page_after(self, value, pk, number):
+        rows = list(self.ordered(
+            True, self.keyset(value, pk, 'lt'))[:self.per_page + 1])
+        return self.build_page(rows, number)
+
+    def page_before(self, value, pk, number):
+        rows = list(self.ordered(
+            False, self.keyset(value, pk, 'gt'))[:self.per_page + 1])
+        if len(rows) <= self.per_page or number <= 1:
+            # Дошли до начала ленты: показываем первую страницу целиком.
+            return self.page_number(1)
+        rows = rows[:self.per_page]
+        rows.reverse()
+        rows.append(None)
+        return self.build_page(rows, number)
+
+    def build_page(self, rows, number):
+        """Строит страницу из per_page + 1 строк (лишняя — признак next)."""
+        self.number = number
+        self.has_next = len(rows) > self.per_page
+        objects = [row for row in rows[:self.per_page] if row is not None]
+        if objects:
+            first, last = objects[0], objects[-1]
+            if number > 1:
+                self.previous_cursor = encode_cursor(
+                    getattr(first, self.key_attr), first.pk, number - 1)
+            if self.has_next:
+                self.next_cursor = encode_cursor(
+                    getattr(last, self.key_attr), last.pk, number + 1)
+        return Page(objects, number, self)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для админки без полного COUNT(*) по большой таблице.
+
+    Для списка без фильтров число строк оценивается по максимальному id
+    (поиск по индексу первичного ключа); отфильтрованный список
+    считается точно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if queryset.query.where:
+            return super().count
+        return queryset.aggregate(estimate=Max('pk'))['estimate'] or 0
@@ -0,0 +1,137 @@
+"""Уменьшенные копии картинок постов с дисковым кэшем и вытеснением LRU.
+
+Копия строится из Post.image с обрезкой по центру и сохраняется в
+RESIZE_CACHE_ROOT. Индекс кэша (размер файла и время последнего
+использования) лежит в локальном файле SQLite, общем для всех процессов.
+Когда суммарный размер превышает RESIZE_CACHE_MAX_BYTES, удаляются
+давно не использованные копии. Время использования обновляется не чаще
+раза в RESIZE_CACHE_TOUCH_INTERVAL, чтобы попадание в кэш почти никогда
+не писало в индекс.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+from PIL import ImageOps
+
+from posts import images
+from posts.localdb import LocalDatabase
+from posts.settings import IMAGE_QUALITY
+from posts.settings import RESIZE_CACHE_MAX_BYTES
+from posts.settings import RESIZE_CACHE_TOUCH_INTERVAL
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS entries ('
+    'key TEXT PRIMARY KEY, file TEXT NOT NULL, '
+    'size INTEGER NOT NULL, used REAL NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS entries_used ON entries (used)',
+)
+
+index = LocalDatabase(
+    lambda: os.path.join(settings.RESIZE_CACHE_ROOT, 'index.sqlite3'),
+    *SCHEMA)
+
+
+def version(image_name):
+    """Метка картинки для URL: меняется вместе с файлом поста."""
+    return hashlib.sha256(image_name.encode()).hexdigest()[:12]
+
+
+def cache_key(image_name, width, height):
+    return hashlib.sha256(
+        f'{image_name}:{width}x{height}'.encode()).hexdigest()
+
+
+def cache_path(file):
+    return os.path.join(settings.RESIZE_CACHE_ROOT, file)
+
+
+def resize(image_name, width, height):
+    """Уменьшает картинку с обрезкой по центру.
+
+    Возвращает (данные, расширение).
+    """
+    with default_storage.open(image_name) as source:
+        image = Image.open(source)
+        alpha = images.has_alpha(image)
+        image = image.convert('RGBA' if alpha else 'RGB')
+    image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+    format = images.output_format(alpha)
+    buffer = BytesIO()
+    image.save(buffer, format, quality=IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue(), images.EXTENSIONS[format]
+
+
+def write(path, data):
+    """Пишет файл атомарно: читатели не увидят его недописанным."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(descriptor, 'wb') as temp_file:
+        temp_file.write(data)
+    os.replace(temp_path, path)
+
+
+def open_resized(image_name, width, height):
+    """Открывает уменьшенную копию, при промахе создаёт её.
+
+    Файл открывается сразу, поэтому вытеснение из другого процесса уже
+    не помешает его отдать.
+    """
+    key = cache_key(image_name, width, height)
+    now = time.time()
+    row = index.execute('SELECT file, used FROM entries WHERE key = ?',
+                        [key]).fetchone()
+    if row is not None:
+        file, used = row
+        try:
+            opened = open(cache_path(file), 'rb')
+        except FileNotFoundError:
+            pass
+        else:
+            if now - used > RESIZE_CACHE_TOUCH_INTERVAL:
+                index.execute('UPDATE entries SET used = ? WHERE key = ?',
+                              [now, key])
+            return opened
+    data, extension = resize(image_name, width, height)
+    file = f'{key[:2]}/{key}.{extension}'
+    write(cache_path(file), data)
+    opened = open(cache_path(file), 'rb')
+    index.execute('INSERT OR REPLACE INTO entries (key, file, size, used) '
+                  'VALUES (?, ?, ?, ?)', [key, file, len(data), now])
+    evict()
+    return opened
+
+
+def evict(max_bytes=None):
+    """Удаляет давно не использованные копии, пока кэш больше бюджета.
+
+    Возвращает кол-во удалённых файлов.
+    """
+    if max_bytes is None:
+        max_bytes = RESIZE_CACHE_MAX_BYTES
+    total, = index.execute(
+        'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()
+    excess = total - max_bytes
+    removed = []
+    if excess > 0:
+        rows = index.execute('SELECT key, file, size FROM entries '
+                             'ORDER BY used').fetchall()
+        for key, file, size in rows:
+            if excess <= 0:
+                break
+            removed.append((key, file))
+            excess -= size
+    index.connection.executemany('DELETE FROM entries WHERE key = ?',
+                                 [[key] for key, _ in removed])
+    for _, file in removed:
+        try:
+            os.remove(cache_path(file))
+        except FileNotFoundError:
+            pass
+    return len(removed)
@@ -0,0 +1,129 @@
+"""Полнотекстовый поиск по постам и комментариям (SQLite FTS5).
+
+Индексы posts_post_fts и posts_comment_fts — external content таблицы
+над posts_post и posts_comment (rowid = id записи); их синхронизируют
+триггеры из миграции 0012_search_index. Миграции SQLite, пересоздающие
+эти таблицы, удаляют триггеры — после них нужна команда
+rebuild_search_index.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+MARK_START = '\x02'
+MARK_END = '\x03'
+SNIPPET_TOKENS = 24
+
+SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_post_fts USING fts5("
+    "text, content='posts_post', content_rowid='id')",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS posts_comment_fts USING fts5("
+    "text, content='posts_comment', content_rowid='id')",
+)
+TRIGGERS = tuple(
+    sql
+    for table in ('posts_post', 'posts_comment')
+    for sql in (
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_insert "
+        f"AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_delete "
+        f"AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {table}_fts_update "
+        f"AFTER UPDATE OF text ON {table} BEGIN "
+        f"INSERT INTO {table}_fts({table}_fts, rowid, text) "
+        f"VALUES ('delete', old.id, old.text); "
+        f"INSERT INTO {table}_fts(rowid, text) VALUES (new.id, new.text); "
+        f"END",
+    )
+)
+
+HITS_SQL = f"""
+    SELECT 'post', f.rowid, f.rowid,
+           snippet(posts_post_fts, 0, %s, %s, '…', {SNIPPET_TOKENS}),
+           bm25(posts_post_fts) AS rank
+    FROM posts_post_fts AS f
+    WHERE posts_post_fts MATCH %s
+    UNION ALL
+    SELECT 'comment', f.rowid, c.post_id,
+           snippet(posts_comment_fts, 0, %s, %s, '…', {SNIPPET_TOKENS}),
+           bm25(posts_comment_fts) AS rank
+    FROM posts_comment_fts AS f
+    JOIN posts_comment AS c ON c.id = f.rowid
+    WHERE posts_comment_fts MATCH %s
+    ORDER BY rank
+    LIMIT %s OFFSET %s
+"""
+COUNT_SQL = """
+    SELECT (SELECT count(*) FROM posts_post_fts
+            WHERE posts_post_fts MATCH %s)
+         + (SELECT count(*) FROM posts_comment_fts
+            WHERE posts_comment_fts MATCH %s)
+"""
+POST_IDS_SQL = (
+    'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s'
+)
+
+Hit = namedtuple('Hit', ('kind', 'id', 'post_id', 'snippet'))
+
+
+def to_match(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово ищется как префикс, все слова должны встретиться.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet)
+                     .replace(MARK_START, '<mark>')
+                     .replace(MARK_END, '</mark>'))
+
+
+class SearchResults:
+    """Ленивый список совпадений, упорядоченных по bm25, для Paginator."""
+
+    def __init__(self, query):
+        self.match = to_match(query)
+
+    def count(self):
+        if not self.match:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(COUNT_SQL, [self.match, self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError('SearchResults поддерживает только срезы')
+        if not self.match:
+            return []
+        limit = index.stop - index.start
+        marks = [MARK_START, MARK_END]
+        with connection.cursor() as cursor:
+            cursor.execute(HITS_SQL, [*marks, self.match, *marks, self.match,
+                                      limit, index.start])
+            rows = cursor.fetchall()
+        return [Hit(kind, id, post_id, highlight(snippet))
+                for kind, id, post_id, snippet, _ in rows]
+
+
+def rebuild():
+    """Создаёт недостающие таблицы и триггеры и перестраивает индексы."""
+    with connection.cursor() as cursor:
+        for sql in SCHEMA + TRIGGERS:
+            cursor.execute(sql)
+        for table in ('posts_post_fts', 'posts_comment_fts'):
+            cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
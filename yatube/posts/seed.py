@@ -0,0 +1,157 @@
+"""Синтетические данные для проверки сайта на больших объёмах.
+
+rows() выдаёт объекты в формате posts/importer.py, поэтому сохраняются
+они тем же bulk_create и производные данные пересобираются так же, как
+при импорте. Всё случайное берётся из random.Random(seed): одинаковые
+параметры и seed дают одинаковые данные (даты отсчитываются от until).
+
+- Популярность авторов степенная (закон Ципфа с показателем alpha): на
+  популярных авторов чаще подписываются, они чаще пишут, и их посты
+  чаще комментируют.
+- Посты идут от старых к новым, и их становится больше ближе к until;
+  время суток распределено по суточному профилю активности (DAY_PROFILE).
+- Часть постов попадает в группы (тоже по Ципфу) и получает картинку из
+  небольшого набора сгенерированных файлов.
+"""
+import bisect
+import itertools
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import Image
+from PIL import ImageDraw
+
+from posts import images
+
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщыэюя'
+WORDS = 5000
+IMAGE_SIZE = (1200, 800)
+# Относительная активность по часам суток: ночью мало, пик вечером.
+DAY_PROFILE = (3, 2, 1, 1, 1, 1, 2, 4, 6, 7, 7, 7,
+               8, 8, 7, 7, 7, 8, 9, 10, 10, 9, 7, 5)
+DAY_CUMULATIVE = list(itertools.accumulate(DAY_PROFILE))
+
+
+def zipf_weights(count, alpha):
+    return [1 / rank ** alpha for rank in range(1, count + 1)]
+
+
+def make_word(rng):
+    return ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(2, 10)))
+
+
+def make_text(rng, vocabulary):
+    count = max(3, int(rng.lognormvariate(3, 0.8)))
+    return ' '.join(rng.choices(vocabulary, k=count)).capitalize() + '.'
+
+
+def make_image(rng):
+    """Рисует картинку из случайных фигур и сохраняет её как загрузку."""
+    image = Image.new('RGB', IMAGE_SIZE, tuple(rng.choices(range(256), k=3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(5, 30)):
+        x, y = rng.randrange(IMAGE_SIZE[0]), rng.randrange(IMAGE_SIZE[1])
+        size = rng.randint(20, 400)
+        shape = rng.choice((draw.ellipse, draw.rectangle))
+        shape((x, y, x + size, y + size),
+              fill=tuple(rng.choices(range(256), k=3)))
+    upload = BytesIO()
+    image.save(upload, 'JPEG', quality=90)
+    content = images.ingest(upload)
+    images.store(content)
+    return content.name
+
+
+def day_time(fraction):
+    """Переводит долю суток в долю по профилю активности (монотонно)."""
+    position = fraction * DAY_CUMULATIVE[-1]
+    hour = bisect.bisect_right(DAY_CUMULATIVE, position)
+    before = DAY_CUMULATIVE[hour - 1] if hour else 0
+    return (hour + (position - before) / DAY_PROFILE[hour]) / 24
+
+
+def post_dates(rng, count, days, until):
+    """count дат за days дней до until по возрастанию, гуще к концу.
+
+    Порядковые статистики равномерного распределения строятся сразу
+    по убыванию (u_k = u_(k+1) * V^(1/k)), поэтому даты не нужно
+    хранить и сортировать.
+    """
+    position = 1.0
+    for remaining in range(count, 0, -1):
+        position *= rng.random() ** (1 / remaining)
+        age = days * position ** 2
+        day, fraction = divmod(days - age, 1)
+        yield until - timedelta(days=days - day - day_time(fraction))
+
+
+def pick_authors(rng, authors, cum_weights, count, exclude):
+    """count разных авторов по весам, кроме exclude."""
+    count = min(count, len(authors) - 1)
+    chosen = set()
+    for _ in range(10):
+        if len(chosen) >= count:
+            break
+        chosen.update(rng.choices(authors, cum_weights=cum_weights,
+                                  k=count - len(chosen)))
+        chosen.discard(exclude)
+    if len(chosen) < count:
+        # Хвост распределения почти не выпадает — добираем равномерно.
+        rest = [author for author in authors
+                if author not in chosen and author != exclude]
+        chosen.update(rng.sample(rest, count - len(chosen)))
+    return sorted(chosen)
+
+
+def rows(users, posts, follows_per_user, until, seed=0, alpha=1.0,
+         days=365, groups=20, group_share=0.3, image_share=0.2,
+         image_pool=20, comments_per_post=1.0, prefix='user'):
+    """Объекты для importer.Importer.load_rows()."""
+    rng = random.Random(seed)
+    vocabulary = [make_word(rng) for _ in range(WORDS)]
+    usernames = [f'{prefix}{number:07d}' for number in range(users)]
+    ranked = usernames[:]
+    rng.shuffle(ranked)
+    weights = zipf_weights(users, alpha)
+    popularity = dict(zip(ranked, weights))
+    cum_weights = list(itertools.accumulate(weights))
+    # Средний вес автора поста: нормирует число комментариев.
+    post_weight = sum(weight ** 2 for weight in weights) / cum_weights[-1]
+    slugs = [f'{prefix}-group-{number}' for number in range(groups)]
+    group_weights = list(itertools.accumulate(zipf_weights(groups, alpha)))
+    pool = [make_image(rng) for _ in range(image_pool if image_share else 0)]
+
+    for username in usernames:
+        yield {'type': 'user', 'username': username,
+               'first_name': make_word(rng).capitalize(),
+               'last_name': make_word(rng).capitalize()}
+    for slug in slugs:
+        yield {'type': 'group', 'slug': slug,
+               'title': make_text(rng, vocabulary)[:200],
+               'description': make_text(rng, vocabulary)[:200]}
+    for username in usernames:
+        for author in pick_authors(rng, ranked, cum_weights,
+                                   follows_per_user, username):
+            yield {'type': 'follow', 'user': username, 'author': author}
+    for number, pub_date in enumerate(post_dates(rng, posts, days, until)):
+        author = rng.choices(ranked, cum_weights=cum_weights)[0]
+        mean = comments_per_post * popularity[author] / post_weight
+        comments = int(rng.expovariate(1 / mean) + 0.5) if mean else 0
+        post = {'type': 'post', 'author': author,
+                'text': make_text(rng, vocabulary), 'pub_date': pub_date}
+        if comments:
+            # id нужен только для ссылок из комментариев.
+            post['id'] = number
+        if slugs and rng.random() < group_share:
+            post['group'] = rng.choices(slugs, cum_weights=group_weights)[0]
+        if pool and rng.random() < image_share:
+            post['image'] = rng.choice(pool)
+        yield post
+        created = pub_date
+        for _ in range(comments):
+            created = min(created + timedelta(
+                hours=rng.expovariate(1 / 6)), until)
+            yield {'type': 'comment', 'post': number,
+                   'author': rng.choice(usernames),
+                   'text': make_text(rng, vocabulary), 'created': created}
@@ -1,2 +1,28 @@
 # Кол-во постов на страницу
 POSTS_PER_PAGE = 10
+# Максимальное кол-во записей в ленте подписок одного пользователя
+TIMELINE_MAX_SIZE = 1000
+# Сколько первых страниц ленты доступно по старым ссылкам ?page=N
+PAGE_NUMBER_LIMIT = 5
+# Время жизни закэшированных страниц, сек (сбрасываются по поколениям)
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Время жизни закэшированных карточек постов, сек
+CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Кол-во комментариев в одной порции на странице поста
+COMMENTS_PER_PAGE = 20
+# Кол-во потоков, создающих миниатюры (0 — создавать сразу в запросе)
+THUMBNAIL_WORKERS = 2
+# Через сколько секунд повторить неудавшееся создание миниатюры
+THUMBNAIL_FAILURE_TIMEOUT = 60 * 60
+# Наибольшая сторона загруженной картинки после пережатия, px
+IMAGE_MAX_SIZE = 2048
+# Качество пережатия картинок (JPEG/WEBP)
+IMAGE_QUALITY = 85
+# Размеры, которые отдаёт /media/resize/ и которые попадают в srcset карточки
+RESIZE_SIZES = ((480, 320), (960, 640), (1440, 960))
+# Бюджет дискового кэша уменьшенных картинок, байт
+RESIZE_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Как часто обновлять время последнего использования копии в кэше, сек
+RESIZE_CACHE_TOUCH_INTERVAL = 60
+# Сколько строк читать из БД за один запрос при выгрузке
+EXPORT_CHUNK_SIZE = 2000
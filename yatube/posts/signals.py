@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_save
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from posts import caching
+from posts import images
+from posts import stats
+from posts import timeline
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+
+
+def bump(*scopes):
+    """Сбрасывает страницы областей после фиксации транзакции.
+
+    Иначе запрос, который ещё читает старые данные, закэшировал бы их
+    под новым поколением.
+    """
+    transaction.on_commit(lambda: caching.bump(*scopes))
+
+
+def bump_post_pages(post, *group_slugs):
+    bump(*caching.post_page_scopes(post, *group_slugs))
+
+
+def bump_follow_pages(follow):
+    bump(*(caching.author_scope(user.username)
+           for user in (follow.author, follow.user) if user))
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    old = None
+    if instance.pk is not None:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group__slug', 'image').first()
+    instance._old_group_slug, instance._old_image = old or (None, '')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+        stats.increment(instance.author_id, 'posts_count')
+    if instance.image.name != instance._old_image:
+        images.retain(instance.image.name)
+        images.release(instance._old_image)
+    bump_post_pages(
+        instance,
+        instance.group and instance.group.slug,
+        instance._old_group_slug
+    )
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    stats.increment(instance.author_id, 'posts_count', -1)
+    images.release(instance.image.name)
+    bump_post_pages(instance, instance.group and instance.group.slug)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+        stats.increment(instance.author_id, 'followers_count')
+        stats.increment(instance.user_id, 'following_count')
+    bump_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+    stats.increment(instance.author_id, 'followers_count', -1)
+    stats.increment(instance.user_id, 'following_count', -1)
+    bump_follow_pages(instance)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    bump(caching.post_scope(instance.post_id))
+
+
+@receiver(pre_save, sender=Group)
+def group_saving(sender, instance, **kwargs):
+    instance._old_slug = None
+    if instance.pk is not None:
+        instance._old_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    # Карточки постов группы зависят от её области (posts.caching).
+    bump(*{caching.group_scope(slug)
+           for slug in (instance.slug, instance._old_slug) if slug})
+
+
+RECEIVERS = (
+    (pre_save, post_saving, Post),
+    (post_save, post_saved, Post),
+    (post_delete, post_deleted, Post),
+    (post_save, follow_saved, Follow),
+    (post_delete, follow_deleted, Follow),
+    (post_save, comment_changed, Comment),
+    (post_delete, comment_changed, Comment),
+    (pre_save, group_saving, Group),
+    (post_save, group_saved, Group),
+)
+
+
+@contextmanager
+def suspended():
+    """Отключает обработчики на время массовой загрузки данных.
+
+    Производные данные после неё нужно пересобрать целиком (см.
+    posts.importer).
+    """
+    for signal, handler, sender in RECEIVERS:
+        signal.disconnect(handler, sender=sender)
+    try:
+        yield
+    finally:
+        for signal, handler, sender in RECEIVERS:
+            signal.connect(handler, sender=sender)
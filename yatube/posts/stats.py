@@ -0,0 +1,74 @@
+"""Денормализованные счётчики авторов (AuthorStats).
+
+Счётчики меняются сигналами при создании и удалении Post и Follow;
+расхождения, накопившиеся, например, после bulk-операций, исправляет
+reconcile() (команда reconcile_author_stats).
+"""
+from django.db.models import Count
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from posts.models import AuthorStats
+from posts.models import Follow
+from posts.models import Post
+from posts.models import User
+
+FIELDS = ('posts_count', 'followers_count', 'following_count')
+
+
+def increment(user_id, field, delta=1):
+    """Сдвигает счётчик автора; отсутствующую строку пересчитывает.
+
+    Разошедшийся счётчик не уходит ниже нуля (поле беззнаковое) —
+    исправит его reconcile().
+    """
+    if user_id is None:
+        return
+    updated = AuthorStats.objects.filter(user_id=user_id).update(
+        **{field: Greatest(F(field) + delta, 0)})
+    if not updated and delta > 0:
+        reconcile([user_id])
+
+
+def count_by(queryset, field, user_ids):
+    return dict(queryset
+                .filter(**{f'{field}__in': user_ids})
+                .values_list(field)
+                .annotate(total=Count('pk'))
+                .order_by())
+
+
+def reconcile(user_ids=None, batch_size=1000):
+    """Сверяет счётчики с реальными данными и исправляет расхождения.
+
+    Возвращает кол-во созданных или исправленных строк.
+    """
+    users = User.objects.order_by('pk')
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+    user_ids = list(users.values_list('pk', flat=True))
+    fixed = 0
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        actual = {
+            'posts_count': count_by(Post.objects, 'author', batch),
+            'followers_count': count_by(Follow.objects, 'author', batch),
+            'following_count': count_by(Follow.objects, 'user', batch),
+        }
+        existing = AuthorStats.objects.in_bulk(batch)
+        missing, drifted = [], []
+        for user_id in batch:
+            values = {field: actual[field].get(user_id, 0)
+                      for field in FIELDS}
+            stats = existing.get(user_id)
+            if stats is None:
+                missing.append(AuthorStats(user_id=user_id, **values))
+            elif any(getattr(stats, field) != value
+                     for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(stats, field, value)
+                drifted.append(stats)
+        AuthorStats.objects.bulk_create(missing, ignore_conflicts=True)
+        AuthorStats.objects.bulk_update(drifted, FIELDS)
+        fixed += len(missing) + len(drifted)
+    return fixed
@@ -0,0 +1,93 @@
+import hashlib
+
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.safestring import mark_safe
+
+from posts import caching
+from posts import resize
+from posts import thumbnails
+from posts.settings import CARD_CACHE_TIMEOUT
+from posts.settings import RESIZE_SIZES
+
+register = template.Library()
+
+CARD_KEY = 'post-card:{}:{}:{}:{:d}:{}'
+
+
+def card_key(post, group_hide):
+    # Автор и группа выводятся в карточке, но меняются отдельно от поста.
+    shown = [post.author.username, post.author.get_full_name()]
+    if post.group:
+        shown += [post.group.slug, post.group.title]
+    digest = hashlib.md5('\n'.join(shown).encode()).hexdigest()
+    return CARD_KEY.format(post.pk, post.updated.timestamp(),
+                           post.author_posts_count, group_hide, digest)
+
+
+@register.simple_tag
+def post_cards(posts, group_hide=False):
+    """Возвращает HTML карточек постов из кэша, рендеря только промахи.
+
+    Карточка не зависит от зрителя, поэтому ссылки, завязанные на
+    пользователя, должны выводиться вне неё.
+    """
+    # Число постов автора и название группы меняются вместе с их областями.
+    caching.depends_on(*(caching.author_scope(post.author.username)
+                         for post in posts))
+    caching.depends_on(*(caching.group_scope(post.group.slug)
+                         for post in posts if post.group))
+    keys = [card_key(post, group_hide) for post in posts]
+    cards = cache.get_many(keys)
+    missing = [(key, post) for key, post in zip(keys, posts)
+               if key not in cards]
+    ready = thumbnails.ready_card_thumbnails(
+        post.image for _, post in missing)
+    rendered = {
+        key: render_to_string('posts/includes/post_card.html', {
+            'post': post,
+            'group_hide': group_hide,
+            'thumbnail': ready.get(post.image.name),
+        })
+        for key, post in missing
+    }
+    # Карточки с заглушкой вместо миниатюры не кэшируются.
+    cache.set_many({key: rendered[key] for key, post in missing
+                    if not post.image or post.image.name in ready},
+                   CARD_CACHE_TIMEOUT)
+    cards.update(rendered)
+    return [mark_safe(cards[key]) for key in keys]
+
+
+@register.simple_tag
+def post_card(post, group_hide=False):
+    return post_cards([post], group_hide)[0]
+
+
+@register.simple_tag(takes_context=True)
+def card_thumbnail(context, post):
+    """Готовая миниатюра карточки; если её нет, ставит её в очередь.
+
+    post_cards передаёт в контексте миниатюру, найденную заранее вместе
+    с остальными карточками страницы.
+    """
+    if 'thumbnail' in context:
+        thumbnail = context['thumbnail']
+    else:
+        thumbnail = thumbnails.ready_card_thumbnail(post.image)
+    if thumbnail is None:
+        thumbnails.queue(post)
+    return thumbnail
+
+
+@register.simple_tag
+def card_srcset(post):
+    """Значение srcset карточки: копии картинки всех размеров RESIZE_SIZES."""
+    version = resize.version(post.image.name)
+    return ', '.join(
+        f"{reverse('posts:resized_image', args=[post.pk, width, height])}"
+        f"?v={version} {width}w"
+        for width, height in RESIZE_SIZES
+    )
@@ -0,0 +1,79 @@
+from django.db import connection
+from django.test import Client
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+CHANGELIST_URLS = [
+    reverse('admin:posts_post_changelist'),
+    reverse('admin:posts_comment_changelist'),
+    reverse('admin:posts_follow_changelist'),
+]
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'test_admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(title='test_title', slug='test')
+        cls.admin_client = Client()
+        cls.admin_client.force_login(cls.admin)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            author = User.objects.create(
+                username=f'test_author_{User.objects.count()}')
+            post = Post.objects.create(
+                author=author, group=self.group, text='test_text')
+            Comment.objects.create(post=post, author=author, text='test')
+            Follow.objects.create(user=author, author=self.admin)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.admin_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return queries.captured_queries
+
+    def test_changelist_query_count_is_fixed(self):
+        '''Кол-во запросов списка в админке не зависит от кол-ва строк.'''
+        self.add_rows(2)
+        single = {url: len(self.count_queries(url))
+                  for url in CHANGELIST_URLS}
+        self.add_rows(10)
+        for url in CHANGELIST_URLS:
+            with self.subTest(url=url):
+                self.assertEqual(len(self.count_queries(url)), single[url])
+
+    def test_changelist_has_no_full_count(self):
+        '''Список без фильтров не выполняет COUNT(*) по всей таблице.'''
+        self.add_rows(2)
+        for url in CHANGELIST_URLS:
+            with self.subTest(url=url):
+                for query in self.count_queries(url):
+                    sql = query['sql']
+                    self.assertFalse('COUNT(*)' in sql and 'WHERE' not in sql,
+                                     sql)
+
+    def test_related_search_fields(self):
+        '''Комментарии и подписки ищутся по имени пользователя.'''
+        self.add_rows(1)
+        for url in CHANGELIST_URLS[1:]:
+            with self.subTest(url=url):
+                response = self.admin_client.get(url, {'q': 'test_author'})
+                self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_post_search_uses_fulltext_index(self):
+        '''Поиск постов в админке работает через полнотекстовый индекс.'''
+        self.add_rows(1)
+        Post.objects.create(author=self.admin, text='особенный пост')
+        response = self.admin_client.get(CHANGELIST_URLS[0],
+                                         {'q': 'особенн'})
+        self.assertEqual(response.context['cl'].result_count, 1)
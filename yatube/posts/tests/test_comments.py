@@ -0,0 +1,63 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment
+from posts.models import Post
+from posts.models import User
+from posts.settings import COMMENTS_PER_PAGE
+
+COMMENTS_COUNT = COMMENTS_PER_PAGE * 2 + 5
+
+
+class CommentChunksTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.post = Post.objects.create(author=cls.author, text='test_text')
+        for i in range(COMMENTS_COUNT):
+            Comment.objects.create(
+                post=cls.post, author=cls.author, text=f'comment_{i}')
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.id])
+        cls.COMMENTS_URL = reverse('posts:post_comments', args=[cls.post.id])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_detail_renders_first_chunk(self):
+        '''Страница поста показывает только первую порцию комментариев.'''
+        response = self.guest_client.get(self.POST_DETAIL_URL)
+        comments = response.context['comments']
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0].text, f'comment_{COMMENTS_COUNT - 1}')
+        self.assertContains(response, self.COMMENTS_URL + '?after=')
+
+    def test_fragments_walk_all_comments(self):
+        '''Фрагменты по ?after= отдают все комментарии по порядку.'''
+        comments = self.guest_client.get(
+            self.POST_DETAIL_URL).context['comments']
+        seen = list(comments)
+        while comments.has_next():
+            response = self.guest_client.get(
+                self.COMMENTS_URL, {'after': comments.paginator.next_cursor})
+            self.assertTemplateUsed(
+                response, 'posts/includes/comment_list.html')
+            comments = response.context['comments']
+            seen.extend(comments)
+        self.assertEqual(
+            seen, list(Comment.objects.order_by('-created', '-pk')))
+
+    def test_fragment_is_bounded_range_read(self):
+        '''Порция комментариев читается без OFFSET и COUNT(*).'''
+        cursor = self.guest_client.get(
+            self.POST_DETAIL_URL).context['comments'].paginator.next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(self.COMMENTS_URL, {'after': cursor})
+        for query in queries.captured_queries:
+            self.assertNotIn('OFFSET', query['sql'])
+            self.assertNotIn('COUNT(', query['sql'])
@@ -0,0 +1,118 @@
+import os
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Comment
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+USERNAME = 'test_author'
+SLUG = 'test_slug'
+INDEX_URL = reverse('posts:index')
+GROUP_POSTS_URL = reverse('posts:group_posts', kwargs={'slug': SLUG})
+PROFILE_URL = reverse('posts:profile', kwargs={'username': USERNAME})
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=USERNAME)
+        cls.group = Group.objects.create(title='test_title', slug=SLUG)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='test_text')
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.id])
+        cls.url_list = [INDEX_URL, GROUP_POSTS_URL, PROFILE_URL,
+                        cls.POST_DETAIL_URL]
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        # Транзакция теста не фиксируется: сброс поколений после
+        # фиксации (posts.signals) выполняется сразу.
+        on_commit = mock.patch.object(transaction, 'on_commit',
+                                      side_effect=lambda func: func())
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def revalidate(self, url, response):
+        return self.guest_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'],
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+
+    def test_unchanged_pages_return_304(self):
+        '''Неизменившаяся страница отдаётся как 304 без рендеринга.'''
+        for url in self.url_list:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                response = self.revalidate(url, response)
+                self.assertEqual(response.status_code, 304)
+                self.assertIsNone(response.context)
+
+    def test_changes_invalidate_validators(self):
+        '''Новый пост и комментарий меняют ETag затронутых страниц.'''
+        responses = {url: self.guest_client.get(url)
+                     for url in self.url_list}
+        Post.objects.create(author=self.author, group=self.group, text='new')
+        Comment.objects.create(post=self.post, author=self.author, text='c')
+        for url, response in responses.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.revalidate(url, response).status_code,
+                                 200)
+
+    def test_etag_depends_on_viewer(self):
+        '''ETag различается для гостя и авторизованного пользователя.'''
+        client = Client()
+        client.force_login(self.author)
+        self.assertNotEqual(self.guest_client.get(INDEX_URL)['ETag'],
+                            client.get(INDEX_URL)['ETag'])
+
+    def test_validators_survive_cold_process_cache(self):
+        '''Процесс с пустым кэшем отдаёт те же ETag и Last-Modified.'''
+        response = self.guest_client.get(GROUP_POSTS_URL)
+        cache.clear()
+        revalidated = self.revalidate(GROUP_POSTS_URL, response)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated['Last-Modified'],
+                         response['Last-Modified'])
+
+    def test_change_in_other_process_invalidates_validators(self):
+        '''Изменение, замеченное другим процессом, даёт 200, а не 304.'''
+        response = self.guest_client.get(GROUP_POSTS_URL)
+        pid = os.fork()
+        if pid == 0:
+            caching.bump(caching.group_scope(SLUG))
+            os._exit(0)
+        os.waitpid(pid, 0)
+        self.assertEqual(
+            self.revalidate(GROUP_POSTS_URL, response).status_code, 200)
+
+
+class ConditionalGetCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username=USERNAME)
+        self.group = Group.objects.create(title='test_title', slug=SLUG)
+        Post.objects.create(author=self.author, group=self.group,
+                            text='test_text')
+
+    def test_write_committed_after_read_changes_etag(self):
+        '''ETag, выданный до фиксации записи, после неё не подходит.'''
+        with transaction.atomic():
+            Post.objects.create(author=self.author, group=self.group,
+                                text='fresh_post')
+            # Пока запись не зафиксирована, читатели видят старые данные.
+            etag = Client().get(GROUP_POSTS_URL)['ETag']
+        response = Client().get(GROUP_POSTS_URL)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'fresh_post')
+        revalidated = Client().get(GROUP_POSTS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 200)
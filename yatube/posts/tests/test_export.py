@@ -0,0 +1,124 @@
+import csv
+import gzip
+import io
+import json
+import tempfile
+from datetime import datetime
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.urls import reverse
+from django.utils.timezone import utc
+
+from posts import exporter
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='writer',
+                                              password='secret')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(slug='cats', title='Коты')
+        cls.posts = Post.objects.bulk_create(
+            Post(author=cls.author, group=cls.group, text=f'text_{number}')
+            for number in range(5))
+        cls.post = Post.objects.first()
+        Post.objects.filter(pk=cls.post.pk).update(
+            pub_date=datetime(2015, 1, 1, tzinfo=utc))
+        Comment.objects.create(post=cls.post, author=cls.reader,
+                               text='Привет, "мир"')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def read_jsonl(self, chunks):
+        return [json.loads(line) for line in
+                b''.join(chunks).decode().splitlines()]
+
+    def test_jsonl_matches_import_format(self):
+        '''JSONL выгружается в формате yatube_import, без паролей.'''
+        rows = self.read_jsonl(exporter.stream())
+        self.assertEqual([row['type'] for row in rows],
+                         ['user'] * 2 + ['group'] + ['post'] * 5
+                         + ['comment', 'follow'])
+        self.assertNotIn('password', rows[0])
+        post = next(row for row in rows
+                    if row['type'] == 'post' and row['id'] == self.post.pk)
+        self.assertEqual(post['author'], 'writer')
+        self.assertEqual(post['group'], 'cats')
+        self.assertEqual(post['pub_date'], '2015-01-01T00:00:00+00:00')
+        self.assertIn({'type': 'follow', 'user': 'reader',
+                       'author': 'writer'}, rows)
+
+    def test_batches_use_keyset_queries(self):
+        '''Таблица читается пачками по chunk_size, без пропусков.'''
+        with self.assertNumQueries(3):
+            rows = self.read_jsonl(
+                exporter.stream(['post'], chunk_size=2))
+        self.assertEqual(sorted(row['id'] for row in rows),
+                         sorted(Post.objects.values_list('pk', flat=True)))
+
+    def test_csv_gzip(self):
+        '''CSV выгружает одну таблицу с заголовком и сжимается gzip.'''
+        data = gzip.decompress(b''.join(
+            exporter.stream(['comment'], 'csv', gzip=True)))
+        rows = list(csv.DictReader(io.StringIO(data.decode())))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['text'], 'Привет, "мир"')
+        self.assertEqual(rows[0]['author'], 'reader')
+        with self.assertRaises(exporter.ExportError):
+            exporter.stream(['post', 'comment'], 'csv')
+
+    def test_empty_csv_has_header(self):
+        '''Пустая таблица выгружается одним заголовком.'''
+        Follow.objects.all().delete()
+        data = b''.join(exporter.stream(['follow'], 'csv'))
+        self.assertEqual(data.decode().strip(), 'user,author')
+
+    def test_command(self):
+        '''Команда пишет файл и сама включает gzip для *.gz.'''
+        with tempfile.NamedTemporaryFile(suffix='.jsonl.gz') as file:
+            call_command('yatube_export', file.name, '--kind', 'post',
+                         stdout=io.StringIO())
+            rows = self.read_jsonl([gzip.decompress(file.read())])
+        self.assertEqual(len(rows), 5)
+        with self.assertRaises(CommandError):
+            call_command('yatube_export', '-', '--kind', 'post',
+                         '--kind', 'user', '--format', 'csv')
+
+    def test_endpoint_is_staff_only(self):
+        '''Выгрузка по HTTP доступна только персоналу и отдаётся потоком.'''
+        url = reverse('posts:export')
+        self.client.force_login(self.author)
+        response = self.client.get(url, {'kind': 'group'})
+        self.assertEqual(response.status_code, 302)
+        self.author.is_staff = True
+        self.author.save()
+        response = self.client.get(url, {'kind': 'group', 'format': 'csv'})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Disposition'],
+                         'attachment; filename="yatube-group.csv"')
+        self.assertEqual(b''.join(response.streaming_content).decode(),
+                         'slug,title,description\r\ncats,Коты,\r\n')
+        response = self.client.get(url, {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_endpoint_gzip_flag(self):
+        '''gzip включают 1/true/yes, а 0 и false его не включают.'''
+        self.author.is_staff = True
+        self.author.save()
+        self.client.force_login(self.author)
+        url = reverse('posts:export')
+        for value, compressed in (('1', True), ('true', True), ('Yes', True),
+                                  ('0', False), ('false', False), ('', False)):
+            with self.subTest(gzip=value):
+                response = self.client.get(url, {'kind': 'group',
+                                                 'gzip': value})
+                self.assertEqual(
+                    response['Content-Type'] == 'application/gzip',
+                    compressed)
@@ -123,7 +123,7 @@ class PostFormTests(TestCase):
         self.assertEqual(self.group_new.id, form_data_new['group'])
         self.assertEqual(self.post.text, form_data_new['text'])
         self.assertEqual(original_author, self.post.author)
-        self.assertEqual(self.post.image, 'posts/small.gif')
+        self.assertRegex(self.post.image.name, r'^posts/\w{2}/\w{64}\.\w+$')
 
     def test_post_create_and_edit_page_show_correct_context(self):
         '''Проверяется добавление/редактирование записи
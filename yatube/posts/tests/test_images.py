@@ -0,0 +1,131 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.db import transaction
+from django.test import override_settings
+from django.test import TestCase
+from django.test import TransactionTestCase
+from django.urls import reverse
+from PIL import Image
+
+from posts import images
+from posts.models import ImageBlob
+from posts.models import Post
+from posts.models import User
+from posts.settings import IMAGE_MAX_SIZE
+
+POST_CREATE_URL = reverse('posts:post_create')
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_upload(size=(3000, 1500), name='photo.jpg'):
+    image = Image.new('RGB', size, (200, 10, 10))
+    exif = Image.Exif()
+    exif[0x0110] = 'Test Camera'
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageIngestTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_ingest_resizes_and_strips_metadata(self):
+        '''Картинка уменьшается, теряет EXIF и получает имя по хэшу.'''
+        content = images.ingest(make_upload())
+        image = Image.open(content)
+        self.assertEqual(max(image.size), IMAGE_MAX_SIZE)
+        self.assertNotIn('exif', image.info)
+        self.assertRegex(content.name, r'^posts/\w{2}/\w{64}\.\w+$')
+
+    def test_same_upload_gives_same_name(self):
+        '''Одинаковые загрузки дают одно имя файла.'''
+        self.assertEqual(images.ingest(make_upload()).name,
+                         images.ingest(make_upload(name='copy.jpg')).name)
+
+    def test_transparency_is_kept(self):
+        '''Прозрачная картинка не теряет альфа-канал.'''
+        buffer = BytesIO()
+        Image.new('RGBA', (10, 10), (0, 0, 0, 0)).save(buffer, 'PNG')
+        content = images.ingest(
+            SimpleUploadedFile('alpha.png', buffer.getvalue(), 'image/png'))
+        self.assertIn('A', Image.open(content).mode)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageDedupTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='test_author')
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, text):
+        self.client.post(POST_CREATE_URL,
+                         data={'text': text, 'image': make_upload()})
+        return Post.objects.get(text=text)
+
+    def test_identical_images_share_one_file(self):
+        '''Одинаковые картинки хранятся одним файлом со счётчиком ссылок.'''
+        first = self.create_post('first')
+        second = self.create_post('second')
+        self.assertEqual(first.image.name, second.image.name)
+        name = first.image.name
+        self.assertEqual(len(os.listdir(os.path.dirname(first.image.path))),
+                         1)
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 2)
+        first.delete()
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(ImageBlob.objects.get(name=name).refs, 1)
+        second.delete()
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_replaced_image_is_released(self):
+        '''Заменённая картинка поста освобождается.'''
+        post = self.create_post('first')
+        name = post.image.name
+        post.image = ''
+        post.save()
+        self.assertFalse(default_storage.exists(name))
+
+    def test_store_keeps_existing_file(self):
+        '''Файл с тем же именем не заменяется, временных файлов не остаётся.'''
+        content = images.ingest(make_upload())
+        self.assertTrue(images.store(content))
+        path = default_storage.path(content.name)
+        with open(path, 'wb') as file:
+            file.write(b'written by another request')
+        self.assertFalse(images.store(content))
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), b'written by another request')
+        self.assertEqual(os.listdir(os.path.dirname(path)),
+                         [os.path.basename(path)])
+
+    def test_file_removed_when_post_is_not_saved(self):
+        '''Картинка незафиксированного поста не остаётся в хранилище.'''
+        def run(operation, func):
+            with transaction.atomic():
+                func()
+                raise OperationalError('disk I/O error')
+
+        with mock.patch('posts.views.writes') as writes:
+            writes.run.side_effect = run
+            with self.assertRaises(OperationalError):
+                self.create_post('lost')
+        self.assertFalse(Post.objects.filter(text='lost').exists())
+        name = images.ingest(make_upload()).name
+        self.assertFalse(default_storage.exists(name))
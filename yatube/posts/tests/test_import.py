@@ -0,0 +1,109 @@
+import json
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils.timezone import utc
+
+from posts import importer
+from posts.models import AuthorStats
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import TimelineEntry
+from posts.models import User
+from posts.search import SearchResults
+
+ROWS = [
+    {'type': 'comment', 'post': 7, 'author': 'reader', 'text': 'old_comment',
+     'created': '2015-01-02T10:00:00+00:00'},
+    {'type': 'user', 'username': 'writer', 'first_name': 'Лев'},
+    {'type': 'user', 'username': 'reader'},
+    {'type': 'group', 'slug': 'legacy', 'title': 'Legacy'},
+    {'type': 'post', 'id': 7, 'author': 'writer', 'text': 'legacy_text',
+     'pub_date': '2015-01-01T10:00:00+00:00', 'group': 'legacy'},
+    {'type': 'post', 'id': 8, 'author': 'nobody', 'text': 'orphan'},
+    {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+]
+
+
+class ImportCommandTests(TestCase):
+    def run_import(self, rows, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            file.write('\n'.join(json.dumps(row) for row in rows))
+            file.flush()
+            output = StringIO()
+            call_command('yatube_import', file.name, *args, stdout=output)
+        return output.getvalue()
+
+    def test_import(self):
+        '''Загрузка создаёт объекты с датами из файла и считает строки/с.'''
+        output = self.run_import(ROWS, '--chunk-size', '100')
+        self.assertIn('строк/с', output)
+        writer = User.objects.get(username='writer')
+        post = Post.objects.get(text='legacy_text')
+        self.assertEqual(post.author, writer)
+        self.assertEqual(post.group, Group.objects.get(slug='legacy'))
+        self.assertEqual(post.pub_date,
+                         datetime(2015, 1, 1, 10, tzinfo=utc))
+        comment = Comment.objects.get(text='old_comment')
+        self.assertEqual(comment.post, post)
+        self.assertEqual(comment.created.year, 2015)
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author=writer).exists())
+        self.assertFalse(Post.objects.filter(text='orphan').exists())
+        self.assertIn('post: загружено 1, пропущено 1', output)
+
+    def test_derived_data_is_rebuilt(self):
+        '''После загрузки пересобраны ленты, счётчики и поиск.'''
+        self.run_import(ROWS)
+        writer = User.objects.get(username='writer')
+        reader = User.objects.get(username='reader')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=reader, post__author=writer).exists())
+        self.assertEqual(AuthorStats.objects.get(user=writer).posts_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(user=writer).followers_count, 1)
+        self.assertEqual(SearchResults('legacy_text').count(), 1)
+
+    def test_signals_are_restored(self):
+        '''После загрузки сигналы снова работают.'''
+        self.run_import(ROWS[1:3])
+        writer = User.objects.get(username='writer')
+        Post.objects.create(author=writer, text='new')
+        self.assertEqual(AuthorStats.objects.get(user=writer).posts_count, 1)
+        self.assertIsNotNone(Post.objects.get(text='new').pub_date)
+
+    def test_existing_users_are_reused(self):
+        '''Существующие пользователи не создаются повторно.'''
+        User.objects.create(username='writer')
+        self.run_import(ROWS)
+        self.assertEqual(User.objects.filter(username='writer').count(), 1)
+        self.assertTrue(Post.objects.filter(text='legacy_text').exists())
+
+    def test_stdin_is_not_closed(self):
+        '''Загрузка из stdin не закрывает его.'''
+        stdin = StringIO('\n'.join(json.dumps(row) for row in ROWS))
+        with mock.patch('sys.stdin', stdin):
+            call_command('yatube_import', '-', stdout=StringIO())
+        self.assertFalse(stdin.closed)
+        self.assertTrue(Post.objects.filter(text='legacy_text').exists())
+
+    def test_chunk_is_written_under_write_lock(self):
+        '''Порция с заранее выданными id пишется под блокировкой записи.'''
+        with mock.patch.object(importer.writes, 'write',
+                               wraps=importer.writes.write) as write:
+            self.run_import(ROWS)
+        write.assert_called_with('import')
+
+    def test_bad_input(self):
+        '''Испорченная строка останавливает загрузку с понятной ошибкой.'''
+        with self.assertRaisesMessage(CommandError, 'Строка 2'):
+            self.run_import([ROWS[1], ['not', 'an', 'object']])
+        with self.assertRaisesMessage(CommandError, 'title'):
+            self.run_import([{'type': 'group', 'slug': 'x'}])
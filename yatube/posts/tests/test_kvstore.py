@@ -0,0 +1,62 @@
+import os
+import shutil
+import tempfile
+
+from django.test import override_settings
+from django.test import SimpleTestCase
+from sorl.thumbnail.images import ImageFile
+
+from posts.kvstore import SQLiteKVStore
+
+TEMP_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    THUMBNAIL_KVSTORE_PATH=os.path.join(TEMP_DIR, 'thumbnails.sqlite3'))
+class SQLiteKVStoreTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.store = SQLiteKVStore()
+        self.store.clear()
+
+    def image_file(self, name):
+        image_file = ImageFile(name)
+        image_file.set_size((10, 20))
+        return image_file
+
+    def test_set_get_delete(self):
+        '''Запись сохраняется, читается и удаляется.'''
+        image_file = self.image_file('posts/a.jpg')
+        self.store.set(image_file)
+        self.assertEqual(list(self.store.get(image_file).size), [10, 20])
+        self.store.delete(image_file)
+        self.assertIsNone(self.store.get(image_file))
+
+    def test_store_is_shared(self):
+        '''Запись видна другому экземпляру хранилища (другому процессу).'''
+        image_file = self.image_file('posts/a.jpg')
+        self.store.set(image_file)
+        self.assertIsNotNone(SQLiteKVStore().get(image_file))
+
+    def test_get_many(self):
+        '''get_many находит только сохранённые записи.'''
+        saved = [self.image_file(f'posts/{i}.jpg') for i in range(3)]
+        for image_file in saved:
+            self.store.set(image_file)
+        found = self.store.get_many(saved + [self.image_file('posts/x.jpg')])
+        self.assertEqual(set(found), {image_file.key for image_file in saved})
+        self.assertEqual(found[saved[0].key].name, 'posts/0.jpg')
+
+    def test_thumbnails_of_source_are_deleted(self):
+        '''Удаление исходника убирает записи его миниатюр.'''
+        source = self.image_file('posts/a.jpg')
+        thumbnail = self.image_file('cache/a_small.jpg')
+        self.store.set(source)
+        self.store.set(thumbnail, source)
+        self.store.delete(source)
+        self.assertIsNone(self.store.get(thumbnail))
+        self.assertEqual(list(self.store._find_keys_raw('')), [])
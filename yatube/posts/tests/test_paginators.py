@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow
+from posts.models import Post
+from posts.models import User
+from posts.paginators import decode_cursor
+from posts.paginators import encode_cursor
+from posts.paginators import KeysetPaginator
+from posts.settings import PAGE_NUMBER_LIMIT
+from posts.settings import POSTS_PER_PAGE
+
+INDEX_URL = reverse('posts:index')
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+POSTS_COUNT = POSTS_PER_PAGE * (PAGE_NUMBER_LIMIT + 2) - 3
+
+
+class KeysetPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        Post.objects.bulk_create(
+            Post(author=cls.author, text=f'test_post_{i}')
+            for i in range(POSTS_COUNT)
+        )
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def get_page(self, params=None):
+        return self.guest_client.get(INDEX_URL, params).context['page_obj']
+
+    def test_cursor_walks_whole_feed(self):
+        '''Переход по ?after= проходит всю ленту без пропусков и повторов.'''
+        page = self.get_page()
+        seen = list(page)
+        while page.has_next():
+            page = self.get_page({'after': page.paginator.next_cursor})
+            seen.extend(page)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(page.number, PAGE_NUMBER_LIMIT + 2)
+
+    def test_before_returns_previous_page(self):
+        '''?before= возвращает предыдущую страницу.'''
+        first = self.get_page()
+        second = self.get_page({'after': first.paginator.next_cursor})
+        third = self.get_page({'after': second.paginator.next_cursor})
+        back = self.get_page({'before': third.paginator.previous_cursor})
+        self.assertEqual(list(back), list(second))
+        self.assertEqual(back.number, 2)
+
+    def test_old_page_numbers_still_work(self):
+        '''Старые ссылки ?page=N открывают первые страницы.'''
+        page = self.get_page({'page': 2})
+        self.assertEqual(
+            list(page), self.expected[POSTS_PER_PAGE:POSTS_PER_PAGE * 2])
+        page = self.get_page({'page': 'abc'})
+        self.assertEqual(page.number, 1)
+
+    def test_cursor_pages_do_not_count_or_offset(self):
+        '''Страницы по курсору не выполняют COUNT(*) и OFFSET.'''
+        cursor = self.get_page().paginator.next_cursor
+        paginator = KeysetPaginator(Post.objects.all(), POSTS_PER_PAGE)
+        with CaptureQueriesContext(connection) as queries:
+            page = paginator.get_page({'after': cursor})
+            page.has_next()
+            page.has_previous()
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'])
+        self.assertNotIn('OFFSET', queries[0]['sql'])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        '''Испорченный токен открывает первую страницу.'''
+        self.assertIsNone(decode_cursor('garbage'))
+        page = self.get_page({'after': 'garbage'})
+        self.assertEqual(page.number, 1)
+
+    def test_cursor_roundtrip(self):
+        '''Токен курсора обратимо кодирует позицию.'''
+        post = self.expected[0]
+        token = encode_cursor(post.pub_date, post.pk, 3)
+        self.assertEqual(decode_cursor(token), (post.pub_date, post.pk, 3))
+
+
+class FollowFeedPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.reader = User.objects.create(username='test_reader')
+        other = User.objects.create(username='test_other_reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=other, author=cls.author)
+        for i in range(POSTS_PER_PAGE * 2 + 1):
+            Post.objects.create(author=cls.author, text=f'test_post_{i}')
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_cursor_walks_follow_feed_once(self):
+        '''Лента подписок по ?after= без повторов из чужих лент.'''
+        page = self.reader_client.get(FOLLOW_INDEX_URL).context['page_obj']
+        seen = list(page)
+        while page.has_next():
+            page = self.reader_client.get(FOLLOW_INDEX_URL, {
+                'after': page.paginator.next_cursor}).context['page_obj']
+            seen.extend(page)
+        self.assertEqual(seen, self.expected)
@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client
+from django.test import TestCase
+from django.urls import reverse
+
+from posts import caching
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.templatetags.post_cards import card_key
+
+INDEX_URL = reverse('posts:index')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.post = Post.objects.create(author=cls.author, text='test_text')
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', args=[cls.post.id])
+        cls.author_client = Client()
+        cls.author_client.force_login(cls.author)
+
+    def setUp(self):
+        cache.clear()
+        # Транзакция теста не фиксируется: сброс поколений после
+        # фиксации (posts.signals) выполняется сразу.
+        on_commit = mock.patch.object(transaction, 'on_commit',
+                                      side_effect=lambda func: func())
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
+
+    def feed_post(self):
+        return Post.objects.for_feed().get(pk=self.post.pk)
+
+    def test_feed_stores_rendered_cards(self):
+        '''Лента кладёт отрендеренные карточки в кэш.'''
+        Client().get(INDEX_URL)
+        card = cache.get(card_key(self.feed_post(), False))
+        self.assertIn('test_text', card)
+
+    def test_edited_post_gets_new_card(self):
+        '''Изменение поста меняет ключ карточки.'''
+        old_key = card_key(self.feed_post(), False)
+        self.post.text = 'edited_text'
+        self.post.save()
+        self.assertNotEqual(card_key(self.feed_post(), False), old_key)
+        self.assertContains(Client().get(INDEX_URL), 'edited_text')
+
+    def test_renamed_group_gets_new_card(self):
+        '''Новое название группы сразу видно в карточках ленты.'''
+        group = Group.objects.create(title='old_title', slug='test_slug')
+        self.post.group = group
+        self.post.save()
+        urls = [INDEX_URL, self.POST_DETAIL_URL,
+                reverse('posts:profile', args=[self.author.username])]
+        for url in urls:
+            self.assertContains(Client().get(url), 'old_title')
+        group.title = 'new_title'
+        group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(Client().get(url), 'new_title')
+
+    def test_group_change_resets_only_group_pages(self):
+        '''Изменение группы сбрасывает её области, а не страницы постов.'''
+        group = Group.objects.create(title='old_title', slug='old_slug')
+        self.post.group = group
+        self.post.save()
+        self.assertContains(Client().get(self.POST_DETAIL_URL), 'old_slug')
+        group.slug = 'new_slug'
+        with mock.patch.object(caching, 'bump',
+                               side_effect=caching.bump) as bump:
+            group.save()
+        self.assertEqual(set(bump.call_args[0]),
+                         {caching.group_scope('old_slug'),
+                          caching.group_scope('new_slug')})
+        self.assertContains(Client().get(self.POST_DETAIL_URL), 'new_slug')
+
+    def test_renamed_author_gets_new_card(self):
+        '''Изменение имени автора меняет ключ карточки.'''
+        old_key = card_key(self.feed_post(), False)
+        self.author.first_name = 'Test'
+        self.author.save()
+        self.assertNotEqual(card_key(self.feed_post(), False), old_key)
+
+    def test_edit_link_is_outside_cached_card(self):
+        '''Ссылка на редактирование видна только автору.'''
+        edit_url = reverse('posts:post_edit', args=[self.post.id])
+        self.assertContains(
+            self.author_client.get(self.POST_DETAIL_URL), edit_url)
+        self.assertNotContains(Client().get(self.POST_DETAIL_URL), edit_url)
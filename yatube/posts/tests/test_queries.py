@@ -0,0 +1,62 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.settings import POSTS_PER_PAGE
+
+SLUG = 'test_slug'
+USERNAME = 'test_author'
+INDEX_URL = reverse('posts:index')
+GROUP_POSTS_URL = reverse('posts:group_posts', kwargs={'slug': SLUG})
+PROFILE_URL = reverse('posts:profile', kwargs={'username': USERNAME})
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+
+
+class FeedQueryCountTests(TestCase):
+    '''Кол-во запросов ленты не зависит от кол-ва постов на странице.'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='test_title', slug=SLUG)
+        cls.reader = User.objects.create(username='test_reader')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_author_with_posts(self, count):
+        author, _ = User.objects.get_or_create(username=USERNAME)
+        Follow.objects.get_or_create(user=self.reader, author=author)
+        for i in range(count):
+            Post.objects.create(author=author, group=self.group, text=str(i))
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_views_have_fixed_query_count(self):
+        '''Ленты выполняют одно и то же число запросов для 1 и N постов.'''
+        urls = [INDEX_URL, GROUP_POSTS_URL, PROFILE_URL, FOLLOW_INDEX_URL]
+        self.create_author_with_posts(1)
+        single = {url: self.count_queries(url) for url in urls}
+        self.create_author_with_posts(POSTS_PER_PAGE - 1)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.count_queries(url), single[url])
+
+    def test_index_is_one_posts_query(self):
+        '''Главная страница для гостя загружает ленту одним запросом.'''
+        self.create_author_with_posts(POSTS_PER_PAGE)
+        with self.assertNumQueries(1):
+            Client().get(INDEX_URL)
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test import TestCase
+from django.urls import reverse
+
+from core.slowqueries import explain
+from posts.models import Comment
+from posts.models import Follow
+from posts.models import Group
+from posts.models import Post
+from posts.models import User
+from posts.settings import POSTS_PER_PAGE
+
+SLUG = 'test_slug'
+USERNAME = 'test_author'
+INDEX_URL = reverse('posts:index')
+GROUP_POSTS_URL = reverse('posts:group_posts', kwargs={'slug': SLUG})
+PROFILE_URL = reverse('posts:profile', kwargs={'username': USERNAME})
+FOLLOW_INDEX_URL = reverse('posts:follow_index')
+# Общая лента без фильтра идёт по индексу даты и обрывается на LIMIT.
+ALLOWED_SCANS = ('SCAN posts_post USING INDEX post_pub_date_idx',)
+
+
+class QueryPlanTests(TestCase):
+    '''Запросы лент и страниц читают данные по индексам, без сортировки.'''
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=USERNAME)
+        cls.reader = User.objects.create(username='test_reader')
+        cls.group = Group.objects.create(title='test_title', slug=SLUG)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'test_post_{i}')
+            for i in range(POSTS_PER_PAGE * 2 + 1)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='test_comment')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, params=None):
+        '''Ответ и все SELECT, выполненные при его построении.'''
+        queries = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        cache.clear()
+        with connection.execute_wrapper(capture):
+            response = self.reader_client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def feed_urls(self, url):
+        '''Первая, вторая (?page=2) и соседние по курсорам страницы.'''
+        response, _ = self.get(url)
+        after = response.context['page_obj'].paginator.next_cursor
+        response, _ = self.get(url, {'after': after})
+        before = response.context['page_obj'].paginator.previous_cursor
+        return [(url, None), (url, {'page': 2}),
+                (url, {'after': after}), (url, {'before': before})]
+
+    def assert_indexed(self, url, params=None):
+        _, queries = self.get(url, params)
+        for sql, query_params in queries:
+            plan = explain(connection, sql, query_params)
+            for line in map(str.strip, plan.splitlines()):
+                with self.subTest(url=url, params=params, step=line,
+                                  sql=sql):
+                    self.assertNotIn('TEMP B-TREE', line)
+                    if line.startswith('SCAN'):
+                        self.assertIn(line, ALLOWED_SCANS)
+
+    def test_feeds_use_indexes(self):
+        '''Ленты и их страницы по курсорам не сканируют и не сортируют.'''
+        for url in (INDEX_URL, GROUP_POSTS_URL, PROFILE_URL,
+                    FOLLOW_INDEX_URL):
+            for page_url, params in self.feed_urls(url):
+                self.assert_indexed(page_url, params)
+
+    def test_post_pages_use_indexes(self):
+        '''Страница поста и комментарии читаются по индексам.'''
+        post_id = self.posts[0].id
+        for url in (reverse('posts:post_detail', args=[post_id]),
+                    reverse('posts:post_comments', args=[post_id])):
+            self.assert_indexed(url)
@@ -0,0 +1,96 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.test import TestCase
+from django.urls import reverse
+from PIL import Image
+
+from posts import resize
+from posts.models import Post
+from posts.models import User
+from posts.templatetags.post_cards import card_srcset
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_CACHE_ROOT = tempfile.mkdtemp()
+
+
+def make_image(size=(1200, 900)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (10, 120, 200)).save(buffer, 'JPEG')
+    return SimpleUploadedFile('photo.jpg', buffer.getvalue(), 'image/jpeg')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   RESIZE_CACHE_ROOT=TEMP_CACHE_ROOT)
+class ResizedImageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.post = Post.objects.create(author=cls.author, text='test_text',
+                                       image=make_image())
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_CACHE_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        resize.evict(max_bytes=0)
+
+    def url(self, width=480, height=320, post_id=None):
+        return reverse('posts:resized_image',
+                       args=[post_id or self.post.id, width, height])
+
+    def test_resized_image(self):
+        '''Картинка отдаётся нужного размера и попадает в дисковый кэш.'''
+        response = self.client.get(self.url())
+        self.assertEqual(response.status_code, 200)
+        image = Image.open(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(image.size, (480, 320))
+        self.assertEqual(
+            resize.index.execute('SELECT count(*) FROM entries').fetchone(),
+            (1,))
+        with mock.patch.object(resize, 'resize') as resize_image:
+            self.assertEqual(self.client.get(self.url()).status_code, 200)
+        resize_image.assert_not_called()
+
+    def test_cache_headers(self):
+        '''URL с актуальной меткой кэшируется браузером надолго.'''
+        version = resize.version(self.post.image.name)
+        response = self.client.get(f'{self.url()}?v={version}')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(f'{self.url()}?v=old')
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_unknown_size_and_missing_image(self):
+        '''Неизвестный размер и пост без картинки дают 404.'''
+        post = Post.objects.create(author=self.author, text='no image')
+        for url in (self.url(100, 100), self.url(post_id=post.id)):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_least_recently_used_is_evicted(self):
+        '''При превышении бюджета удаляется давно не использованная копия.'''
+        for width, height in ((480, 320), (960, 640)):
+            resize.open_resized(self.post.image.name, width, height).close()
+        files = dict(resize.index.execute(
+            'SELECT file, size FROM entries ORDER BY used'))
+        oldest, newest = files
+        self.assertEqual(resize.evict(max_bytes=files[newest]), 1)
+        self.assertFalse(os.path.exists(resize.cache_path(oldest)))
+        self.assertTrue(os.path.exists(resize.cache_path(newest)))
+
+    def test_card_srcset(self):
+        '''srcset карточки перечисляет все размеры с меткой картинки.'''
+        srcset = card_srcset(self.post)
+        self.assertIn(f'{self.url()}?v={resize.version(self.post.image.name)}'
+                      f' 480w', srcset)
+        self.assertIn('1440w', srcset)
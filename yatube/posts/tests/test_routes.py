@@ -18,6 +18,10 @@ class PostRoutesTests(TestCase):
             [f'/profile/{USERNAME}/', 'profile', [USERNAME]],
             [f'/posts/{ID}/edit/', 'post_edit', [ID]],
             [f'/posts/{ID}/comment/', 'add_comment', [ID]],
+            [f'/posts/{ID}/comments/', 'post_comments', [ID]],
+            [f'/media/resize/{ID}/960x640/', 'resized_image', [ID, 960, 640]],
+            ['/search/', 'search', []],
+            ['/export/', 'export', []],
             ['/follow/', 'follow_index', []],
             [f'/profile/{USERNAME}/follow/', 'profile_follow', [USERNAME]],
             [f'/profile/{USERNAME}/unfollow/', 'profile_unfollow', [USERNAME]]
@@ -0,0 +1,64 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment
+from posts.models import Post
+from posts.models import User
+from posts.search import to_match
+
+SEARCH_URL = reverse('posts:search')
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Пост про редкую <b>ящерицу</b>')
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.author, text='Ящерица вернулась')
+        Post.objects.create(author=cls.author, text='Совсем другой текст')
+
+    def search(self, query):
+        return Client().get(SEARCH_URL, {'q': query}).context['page_obj']
+
+    def test_search_finds_posts_and_comments(self):
+        '''Поиск находит и посты, и комментарии.'''
+        hits = list(self.search('ящериц'))
+        self.assertEqual({(hit.kind, hit.post_id) for hit in hits},
+                         {('post', self.post.id), ('comment', self.post.id)})
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        '''Совпадение подсвечено, а HTML из текста экранирован.'''
+        response = Client().get(SEARCH_URL, {'q': 'редкую'})
+        self.assertContains(response, '<mark>редкую</mark>')
+        self.assertContains(response, '&lt;b&gt;')
+
+    def test_index_follows_updates_and_deletes(self):
+        '''Триггеры обновляют индекс при изменении и удалении записей.'''
+        self.post.text = 'Теперь про черепаху'
+        self.post.save()
+        self.comment.delete()
+        self.assertEqual(len(self.search('ящериц')), 0)
+        self.assertEqual(len(self.search('черепах')), 1)
+
+    def test_query_syntax_is_not_passed_to_fts(self):
+        '''Спецсимволы FTS5 в запросе не ломают поиск.'''
+        self.assertEqual(to_match('ящ" OR *('), '"ящ"* "OR"*')
+        self.assertEqual(len(self.search('"*(')), 0)
+
+    def test_rebuild_command(self):
+        '''Команда rebuild_search_index восстанавливает индекс.'''
+        with connection.cursor() as cursor:
+            for table in ('posts_post_fts', 'posts_comment_fts'):
+                cursor.execute(f"INSERT INTO {table}({table}) "
+                               f"VALUES ('delete-all')")
+        self.assertEqual(len(self.search('ящериц')), 0)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(len(self.search('ящериц')), 2)
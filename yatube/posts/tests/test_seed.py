@@ -0,0 +1,92 @@
+import shutil
+import statistics
+import tempfile
+from collections import Counter
+from datetime import datetime
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.test import override_settings
+from django.utils.timezone import utc
+
+from posts import seed
+from posts.models import Follow
+from posts.models import ImageBlob
+from posts.models import Post
+from posts.models import TimelineEntry
+from posts.models import User
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+UNTIL = datetime(2020, 1, 1, tzinfo=utc)
+
+
+def make_rows(**kwargs):
+    kwargs.setdefault('image_share', 0)
+    return list(seed.rows(50, 2000, 5, UNTIL, **kwargs))
+
+
+class SeedRowsTests(TestCase):
+    def test_reproducible(self):
+        '''Одинаковый seed даёт одинаковые данные, другой — другие.'''
+        self.assertEqual(make_rows(seed=1), make_rows(seed=1))
+        self.assertNotEqual(make_rows(seed=1), make_rows(seed=2))
+
+    def test_distributions(self):
+        '''Даты растут к until, популярность авторов степенная.'''
+        rows = make_rows()
+        posts = [row for row in rows if row['type'] == 'post']
+        dates = [post['pub_date'] for post in posts]
+        self.assertEqual(dates, sorted(dates))
+        self.assertGreaterEqual(dates[0], UNTIL - timedelta(days=365))
+        self.assertLessEqual(dates[-1], UNTIL)
+        last_month = sum(date > UNTIL - timedelta(days=30) for date in dates)
+        self.assertGreater(last_month, len(dates) * 30 / 365)
+        per_author = sorted(Counter(post['author'] for post in posts)
+                            .values(), reverse=True)
+        self.assertGreater(per_author[0], 5 * statistics.median(per_author))
+        follows = Counter(row['user'] for row in rows
+                          if row['type'] == 'follow')
+        self.assertEqual(set(follows.values()), {5})
+        grouped = sum('group' in post for post in posts)
+        self.assertAlmostEqual(grouped / len(posts), 0.3, delta=0.05)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedCommandTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_command(self):
+        '''Команда создаёт данные с картинками и пересобирает ленты.'''
+        output = StringIO()
+        call_command('yatube_seed', '--users', '20', '--posts', '200',
+                     '--follows-per-user', '3', '--images', '2',
+                     '--image-share', '0.5', '--until', '2020-01-01',
+                     stdout=output)
+        self.assertIn('строк/с', output.getvalue())
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Follow.objects.count(), 60)
+        self.assertTrue(TimelineEntry.objects.exists())
+        with_image = Post.objects.exclude(image='').count()
+        self.assertGreater(with_image, 0)
+        self.assertEqual(ImageBlob.objects.count(), 2)
+        self.assertEqual(sum(ImageBlob.objects.values_list('refs', flat=True)),
+                         with_image)
+
+    def test_command_rejects_bad_counts(self):
+        '''Неверные --users и --posts дают каждый своё сообщение.'''
+        cases = (
+            (['--users', '0'], 'Нужен хотя бы один пользователь'),
+            (['--posts', '-1'], 'Число постов не может быть отрицательным'),
+        )
+        for args, message in cases:
+            with self.subTest(args=args):
+                with self.assertRaisesMessage(CommandError, message):
+                    call_command('yatube_seed', *args, stdout=StringIO())
@@ -0,0 +1,67 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import AuthorStats
+from posts.models import Follow
+from posts.models import Post
+from posts.models import User
+
+
+class AuthorStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.reader = User.objects.create(username='test_reader')
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_post_signals_update_posts_count(self):
+        '''Создание и удаление поста меняют счётчик постов автора.'''
+        post = Post.objects.create(author=self.author, text='test')
+        Post.objects.create(author=self.author, text='test')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_follow_signals_update_follow_counts(self):
+        '''Подписка и отписка меняют счётчики обоих пользователей.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        Follow.objects.all().delete()
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_reconcile_fixes_drift(self):
+        '''Команда reconcile_author_stats исправляет расхождения.'''
+        Post.objects.bulk_create(
+            Post(author=self.author, text='test') for _ in range(3))
+        call_command('reconcile_author_stats', stdout=StringIO())
+        self.assertEqual(self.stats(self.author).posts_count, 3)
+        self.assertEqual(self.stats(self.reader).posts_count, 0)
+
+    def test_drifted_counter_stops_at_zero(self):
+        '''Удаление постов, не попавших в счётчик, не уводит его ниже нуля.'''
+        Post.objects.create(author=self.author, text='test')
+        Post.objects.bulk_create(
+            Post(author=self.author, text='test') for _ in range(2))
+        Post.objects.filter(author=self.author).delete()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+
+    def test_profile_reads_counters(self):
+        '''Профиль берёт числа из счётчиков, а не из COUNT-запросов.'''
+        cache.clear()
+        Post.objects.create(author=self.author, text='test')
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = Client().get(
+            reverse('posts:profile', args=[self.author.username]))
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertContains(response, 'Подписчиков: 1')
+        self.assertContains(response, 'Подписок: 0')
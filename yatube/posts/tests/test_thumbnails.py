@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client
+from django.test import override_settings
+from django.test import TestCase
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from posts import caching
+from posts import thumbnails
+from posts.models import Post
+from posts.models import User
+
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00'
+             b'\x01\x00\x80\x00\x00\x00\x00\x00'
+             b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+             b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+             b'\x0A\x00\x3B')
+PLACEHOLDER = 'Изображение обрабатывается'
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_KVSTORE_DIR = tempfile.mkdtemp()
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    THUMBNAIL_KVSTORE_PATH=os.path.join(TEMP_KVSTORE_DIR, 'kv.sqlite3'))
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.post = Post.objects.create(
+            author=cls.author,
+            text='test_text',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        cls.POST_DETAIL_URL = reverse('posts:post_detail',
+                                      args=[cls.post.id])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        shutil.rmtree(TEMP_KVSTORE_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear()
+
+    def tearDown(self):
+        # Задачи пула пишут в MEDIA_ROOT теста — дожидаемся их здесь.
+        thumbnails.shutdown()
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        '''Пока миниатюры нет, карточка показывает заглушку.'''
+        response = Client().get(self.POST_DETAIL_URL)
+        self.assertContains(response, PLACEHOLDER)
+        self.assertIsNone(thumbnails.ready_card_thumbnail(self.post.image))
+
+    def test_generated_thumbnail_replaces_placeholder(self):
+        '''Созданная миниатюра сбрасывает кэш и попадает в карточку.'''
+        Client().get(self.POST_DETAIL_URL)
+        with mock.patch.object(thumbnails, 'THUMBNAIL_WORKERS', 0):
+            thumbnails.submit(self.post.image.name,
+                              caching.post_page_scopes(self.post))
+        thumbnail = thumbnails.ready_card_thumbnail(self.post.image)
+        self.assertIsNotNone(thumbnail)
+        response = Client().get(self.POST_DETAIL_URL)
+        self.assertNotContains(response, PLACEHOLDER)
+        self.assertContains(response, thumbnail.url)
+
+    def test_saving_view_does_not_wait_for_thumbnail(self):
+        '''Сохранивший пост запрос ставит миниатюру в очередь и не ждёт.'''
+        client = Client()
+        client.force_login(self.author)
+        release = threading.Event()
+        get_thumbnail = thumbnails.get_thumbnail
+        with mock.patch.object(thumbnails, 'get_thumbnail',
+                               side_effect=lambda *args, **kwargs:
+                               release.wait(5)
+                               and get_thumbnail(*args, **kwargs)), \
+                mock.patch.object(thumbnails.transaction, 'on_commit',
+                                  side_effect=lambda func: func()):
+            started = time.monotonic()
+            response = client.post(reverse('posts:post_create'), {
+                'text': 'new_post',
+                'image': SimpleUploadedFile('new.gif', SMALL_GIF,
+                                            'image/gif'),
+            })
+            elapsed = time.monotonic() - started
+            release.set()
+            thumbnails.shutdown()
+        self.assertEqual(response.status_code, 302)
+        self.assertLess(elapsed, 1)
+        post = Post.objects.get(text='new_post')
+        self.assertIsNotNone(thumbnails.ready_card_thumbnail(post.image))
+
+    def test_page_does_not_wait_for_thumbnail(self):
+        '''Страница с постом ставит миниатюру в очередь и не ждёт её.'''
+        release = threading.Event()
+        with mock.patch.object(thumbnails, 'get_thumbnail',
+                               side_effect=lambda *args, **kwargs:
+                               release.wait(5)), \
+                mock.patch.object(thumbnails.transaction, 'on_commit',
+                                  side_effect=lambda func: func()):
+            started = time.monotonic()
+            response = Client().get(self.POST_DETAIL_URL)
+            elapsed = time.monotonic() - started
+            release.set()
+            thumbnails.shutdown()
+        self.assertContains(response, PLACEHOLDER)
+        self.assertLess(elapsed, 1)
+
+    def test_failed_thumbnail_is_not_requeued(self):
+        '''Неудавшаяся миниатюра не ставится в очередь повторно.'''
+        post = Post.objects.create(author=self.author, text='broken',
+                                   image='posts/missing.gif')
+        with mock.patch.object(thumbnails, 'THUMBNAIL_WORKERS', 0):
+            with self.assertLogs(level='ERROR'):
+                thumbnails.submit(post.image.name, [])
+        self.assertTrue(cache.get(thumbnails.FAILED_KEY.format(
+            post.image.name)))
+        with mock.patch.object(thumbnails.transaction, 'on_commit') as queue:
+            Client().get(reverse('posts:post_detail', args=[post.id]))
+        queue.assert_not_called()
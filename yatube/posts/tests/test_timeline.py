@@ -0,0 +1,84 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import timeline
+from posts.models import Follow
+from posts.models import Post
+from posts.models import TimelineEntry
+from posts.models import User
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='test_author')
+        cls.reader = User.objects.create(username='test_reader')
+        cls.old_post = Post.objects.create(author=cls.author, text='old')
+
+    def timeline(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.reader).values_list('post_id', flat=True))
+
+    def test_follow_backfills_timeline(self):
+        '''Подписка добавляет в ленту уже опубликованные посты автора.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.timeline(), [self.old_post.id])
+
+    def test_new_post_fans_out_to_followers(self):
+        '''Новый пост попадает в ленты подписчиков автора.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='new')
+        self.assertEqual(self.timeline(), [post.id, self.old_post.id])
+
+    def test_unfollow_removes_author_posts(self):
+        '''Отписка убирает посты автора из ленты.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user=self.reader, author=self.author).delete()
+        self.assertEqual(self.timeline(), [])
+
+    def test_timeline_size_is_capped(self):
+        '''trim_timelines оставляет TIMELINE_MAX_SIZE последних постов.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch('posts.timeline.TIMELINE_MAX_SIZE', 2):
+            posts = [Post.objects.create(author=self.author, text=str(i))
+                     for i in range(3)]
+            # Публикация ленты не обрезает.
+            self.assertEqual(len(self.timeline()), 4)
+            call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline(), [posts[2].id, posts[1].id])
+
+    def test_rebuild_command(self):
+        '''Команда rebuild_timelines восстанавливает ленты.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.timeline(), [self.old_post.id])
+
+    def test_fan_out_queries_do_not_grow_with_followers(self):
+        '''Рассылка поста — два запроса при любом числе подписчиков.'''
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='new')
+        with self.assertNumQueries(2):
+            timeline.fan_out(post)
+        Follow.objects.bulk_create(
+            Follow(user=User.objects.create(username=f'test_user_{i}'),
+                   author=self.author)
+            for i in range(5))
+        with self.assertNumQueries(2):
+            timeline.fan_out(post)
+
+    def test_rebuild_drops_orphaned_entries(self):
+        '''Пересборка удаляет ленты пользователей без подписок.'''
+        TimelineEntry.objects.create(user=self.reader, post=self.old_post,
+                                     pub_date=self.old_post.pub_date)
+        call_command('rebuild_timelines', self.reader.username,
+                     stdout=StringIO())
+        self.assertEqual(self.timeline(), [])
+        TimelineEntry.objects.create(user=self.reader, post=self.old_post,
+                                     pub_date=self.old_post.pub_date)
+        timeline.rebuild()
+        self.assertEqual(self.timeline(), [])
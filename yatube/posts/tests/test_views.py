@@ -1,14 +1,21 @@
+import os
 import shutil
 import tempfile
+from unittest import mock
 
 from django.core.cache import cache
+from django.db import connection
+from django.db import transaction
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client
 from django.test import override_settings
 from django.test import TestCase
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from posts import caching
 from posts.models import Follow
 from posts.models import Group
 from posts.models import Post
@@ -86,6 +93,12 @@ class PostPagesTests(TestCase):
 
     def setUp(self):
         cache.clear()
+        # Транзакция теста не фиксируется: сброс поколений после
+        # фиксации (posts.signals) выполняется сразу.
+        on_commit = mock.patch.object(transaction, 'on_commit',
+                                      side_effect=lambda func: func())
+        on_commit.start()
+        self.addCleanup(on_commit.stop)
 
     def test_show_correct_context(self):
         '''Проверяется контекст шаблонов на соответствие.'''
@@ -131,15 +144,86 @@ class PostPagesTests(TestCase):
     def test_cash_in_index_page(self):
         '''Проверяется работа кэша на главной странице.'''
         response = self.authorized_client.get(INDEX_URL)
-        before_records_delete = response.content
-        Post.objects.all().delete()
+        before_records_update = response.content
+        # update() не шлёт сигналов, поэтому страница остаётся в кэше.
+        Post.objects.update(text='changed_text')
         response = self.authorized_client.get(INDEX_URL)
-        after_records_delete = response.content
-        self.assertEqual(before_records_delete, after_records_delete)
+        self.assertEqual(response.content, before_records_update)
         cache.clear()
         response = self.authorized_client.get(INDEX_URL)
-        after_cache_clearing = response.content
-        self.assertNotEqual(after_cache_clearing, before_records_delete)
+        self.assertNotEqual(response.content, before_records_update)
+
+    def test_cache_invalidated_on_post_change(self):
+        '''Новый пост сразу сбрасывает кэш лент и профиля автора.'''
+        url_list = [INDEX_URL, GROUP_POSTS_URL, PROFILE_URL]
+        before = {url: self.guest_client.get(url).content
+                  for url in url_list}
+        Post.objects.create(author=self.author, group=self.group,
+                            text='fresh_post')
+        for url in url_list:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotEqual(response.content, before[url])
+                self.assertContains(response, 'fresh_post')
+
+    def test_author_posts_count_refreshed_on_cached_pages(self):
+        '''Новый пост автора обновляет его счётчик во всех карточках.'''
+        url_list = [GROUP_POSTS_URL, self.POST_DETAIL_URL]
+        # Второй запрос — уже с CSRF-cookie, и страница поста кэшируется.
+        for url in url_list * 2:
+            self.guest_client.get(url)
+        Post.objects.create(author=self.author, group=self.another_group,
+                            text='fresh_post')
+        for url in url_list:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Всего постов автора: <span>2</span>')
+
+    def test_new_post_resets_only_its_own_scopes(self):
+        '''Новый пост не сбрасывает страницы остальных постов автора.'''
+        with mock.patch.object(caching, 'bump') as bump:
+            post = Post.objects.create(author=self.author, text='fresh_post')
+        scopes = {scope for call in bump.call_args_list for scope in call[0]}
+        self.assertIn(caching.post_scope(post.pk), scopes)
+        self.assertIn(caching.author_scope(USERNAME), scopes)
+        self.assertNotIn(caching.post_scope(self.post.pk), scopes)
+
+    def test_generations_shared_between_processes(self):
+        '''Сброс кэша в одном процессе видят остальные.'''
+        scope = caching.group_scope(SLUG)
+        [before] = caching.get_generations([scope])
+        pid = os.fork()
+        if pid == 0:
+            caching.bump(scope)
+            os._exit(0)
+        os.waitpid(pid, 0)
+        [after] = caching.get_generations([scope])
+        self.assertGreater(after, before)
+
+    def test_cached_page_served_without_queries(self):
+        '''Повторный запрос страницы отдаётся из кэша без обращения к БД.'''
+        # Страница с формой кэшируется, когда у клиента уже есть CSRF-cookie.
+        self.guest_client.get(self.POST_DETAIL_URL)
+        self.guest_client.get(self.POST_DETAIL_URL)
+        self.guest_client.get(GROUP_POSTS_URL)
+        for url in (GROUP_POSTS_URL, self.POST_DETAIL_URL):
+            with self.subTest(url=url), self.assertNumQueries(0):
+                self.guest_client.get(url)
+
+    def test_page_changed_while_rendering_is_not_cached(self):
+        '''Страница, область которой менялась при рендеринге, не кэшируется.'''
+        depends_on = caching.depends_on
+
+        def depends_on_changed(*scopes):
+            depends_on(*scopes)
+            caching.bump(*scopes)
+
+        with mock.patch.object(caching, 'depends_on',
+                               side_effect=depends_on_changed):
+            self.guest_client.get(GROUP_POSTS_URL)
+        with CaptureQueriesContext(connection) as queries:
+            self.guest_client.get(GROUP_POSTS_URL)
+        self.assertTrue(queries)
 
     def test_authorized_user_can_follow_on_users(self):
         '''Авторизованный пользователь может подписываться
@@ -166,6 +250,33 @@ class PostPagesTests(TestCase):
         self.assertNotIn(self.post, response_group.context['page_obj'])
 
 
+class PageResetTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create(username=USERNAME)
+        self.group = Group.objects.create(title=TITLE, slug=SLUG)
+        Post.objects.create(author=self.author, group=self.group, text=TEXT)
+        self.guest_client = Client()
+
+    def test_pages_reset_after_commit(self):
+        '''Поколения меняются после фиксации записи, а не внутри неё.
+
+        Иначе запрос, прочитавший до фиксации старые данные, закэшировал
+        бы их под новым поколением.
+        '''
+        scopes = [caching.group_scope(SLUG), caching.author_scope(USERNAME)]
+        self.guest_client.get(GROUP_POSTS_URL)
+        before = caching.get_generations(scopes)
+        with transaction.atomic():
+            Post.objects.create(author=self.author, group=self.group,
+                                text='fresh_post')
+            self.assertEqual(caching.get_generations(scopes), before)
+        after = caching.get_generations(scopes)
+        self.assertTrue(all(new > old for new, old in zip(after, before)))
+        self.assertContains(self.guest_client.get(GROUP_POSTS_URL),
+                            'fresh_post')
+
+
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -0,0 +1,146 @@
+"""Фоновая подготовка миниатюр для карточек постов.
+
+Миниатюры создаются пулом потоков после сохранения поста, а не внутри
+первого запроса, который показывает пост. Ни запрос, сохранивший пост,
+ни страницы, которые показывают пост без миниатюры, её не ждут: они
+лишь ставят задачу в очередь.
+Пока миниатюры нет в KV-хранилище sorl, карточка выводит заглушку и не
+кэшируется; когда миниатюра готова, поток сбрасывает поколения страниц
+с постом. Основную БД поток не трогает: метаданные sorl лежат
+в отдельном файле (posts.kvstore).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail import get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from posts import caching
+from posts.settings import THUMBNAIL_FAILURE_TIMEOUT
+from posts.settings import THUMBNAIL_WORKERS
+
+CARD_GEOMETRY = '960x640'
+CARD_OPTIONS = {'crop': 'center', 'upscale': True}
+FAILED_KEY = 'thumbnail-failed:{}'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_queued = set()
+_lock = threading.Lock()
+
+
+class LookupBackend(ThumbnailBackend):
+    """Вычисляет файл миниатюры так же, как get_thumbnail, но не создаёт её."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+lookup_backend = LookupBackend()
+
+
+def card_thumbnail_file(image):
+    return lookup_backend.thumbnail_file(image, CARD_GEOMETRY, **CARD_OPTIONS)
+
+
+def ready_card_thumbnail(image):
+    """Готовая миниатюра карточки или None, если её ещё нет."""
+    if not image:
+        return None
+    return default.kvstore.get(card_thumbnail_file(image))
+
+
+def ready_card_thumbnails(images):
+    """Готовые миниатюры нескольких картинок: {имя картинки: миниатюра}.
+
+    Если хранилище sorl умеет get_many, все записи читаются одним запросом.
+    """
+    files = {image.name: card_thumbnail_file(image)
+             for image in images if image}
+    if hasattr(default.kvstore, 'get_many'):
+        found = default.kvstore.get_many(files.values())
+    else:
+        found = {file.key: default.kvstore.get(file)
+                 for file in files.values()}
+    return {name: found[file.key] for name, file in files.items()
+            if found.get(file.key) is not None}
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def generate(image_name, scopes):
+    """Создаёт миниатюру карточки и сбрасывает страницы, где она видна."""
+    try:
+        get_thumbnail(image_name, CARD_GEOMETRY, **CARD_OPTIONS)
+        if ready_card_thumbnail(image_name) is None:
+            cache.set(FAILED_KEY.format(image_name), True,
+                      THUMBNAIL_FAILURE_TIMEOUT)
+            return
+        caching.bump(*scopes)
+    except Exception:
+        logger.exception('Не удалось создать миниатюру %s', image_name)
+        cache.set(FAILED_KEY.format(image_name), True,
+                  THUMBNAIL_FAILURE_TIMEOUT)
+    finally:
+        with _lock:
+            _queued.discard(image_name)
+
+
+def submit(image_name, scopes):
+    """Ставит задачу в пул; возвращает Future или None, если задача
+    уже стоит в очереди или выполнена сразу.
+    """
+    with _lock:
+        if image_name in _queued:
+            return None
+        _queued.add(image_name)
+    if THUMBNAIL_WORKERS:
+        return get_executor().submit(generate, image_name, scopes)
+    generate(image_name, scopes)
+    return None
+
+
+def shutdown():
+    """Дожидается задач пула и останавливает его; новый создастся сам."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
+
+
+def queue(post):
+    """Ставит миниатюру поста в очередь после фиксации транзакции."""
+    if not post.image:
+        return
+    name = post.image.name
+    if cache.get(FAILED_KEY.format(name)):
+        return
+    scopes = caching.post_page_scopes(post, post.group and post.group.slug)
+    transaction.on_commit(lambda: submit(name, scopes))
@@ -0,0 +1,116 @@
+"""Материализованная лента подписок.
+
+Лента каждого пользователя хранится в таблице TimelineEntry и обновляется
+при публикации поста и при подписке/отписке, поэтому страница /follow/
+читает готовые записи по индексу (user, pub_date) без join'а Follow и Post.
+
+Публикация только добавляет запись в ленты подписчиков и не обрезает их:
+иначе каждый новый пост перебирал бы ленты всех подписчиков под
+блокировкой записи. Ленты дорастают до TIMELINE_MAX_SIZE и чуть дальше,
+лишнее периодически удаляет manage.py trim_timelines.
+"""
+from django.db import connection
+from django.db import transaction
+from django.db.models import F
+from django.db.models import Window
+from django.db.models.functions import RowNumber
+
+from posts.models import Follow
+from posts.models import Post
+from posts.models import TimelineEntry
+from posts.settings import TIMELINE_MAX_SIZE
+
+
+def trim(user_ids=None):
+    """Удаляет из лент записи, не вошедшие в TIMELINE_MAX_SIZE последних.
+
+    user_ids — список или queryset id пользователей (по умолчанию все);
+    ленты обрезаются одним DELETE. Возвращает кол-во удалённых записей.
+    """
+    entries = TimelineEntry.objects.all()
+    if user_ids is not None:
+        entries = entries.filter(user_id__in=user_ids)
+    ranked = (entries
+              .annotate(position=Window(
+                  RowNumber(), partition_by=[F('user_id')],
+                  order_by=[F('pub_date').desc(), F('post_id').desc()]))
+              .values('pk', 'position'))
+    sql, params = ranked.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TimelineEntry._meta.db_table} WHERE id IN '
+            f'(SELECT ranked.id FROM ({sql}) AS ranked '
+            f'WHERE ranked.position > %s)',
+            [*params, TIMELINE_MAX_SIZE])
+        return cursor.rowcount
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту последними постами автора после подписки."""
+    posts = (Post.objects
+             .filter(author_id=author_id)
+             .order_by('-pub_date')
+             .values_list('pk', 'pub_date')[:TIMELINE_MAX_SIZE])
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+         for post_id, pub_date in posts),
+        ignore_conflicts=True
+    )
+    trim([user_id])
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты посты автора после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild(user_ids=None, batch_size=100):
+    """Пересобирает ленты указанных (или всех) подписчиков.
+
+    batch_size лент пересобираются в одной транзакции. Возвращает кол-во
+    созданных записей.
+    """
+    follows = Follow.objects.all()
+    # Ленты тех, у кого подписок не осталось, просто удаляются.
+    orphans = TimelineEntry.objects.exclude(
+        user_id__in=follows.values('user_id'))
+    if user_ids is not None:
+        follows = follows.filter(user_id__in=user_ids)
+        orphans = orphans.filter(user_id__in=user_ids)
+    orphans.delete()
+    user_ids = sorted(set(follows.values_list('user_id', flat=True)))
+    created = 0
+    for start in range(0, len(user_ids), batch_size):
+        with transaction.atomic():
+            for user_id in user_ids[start:start + batch_size]:
+                created += rebuild_one(user_id)
+    return created
+
+
+def rebuild_one(user_id):
+    """Пересобирает ленту одним INSERT ... SELECT, без объектов в Python."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    posts = (Post.objects
+             .filter(author__following__user_id=user_id)
+             .order_by('-pub_date')
+             .values_list('pk', 'pub_date')[:TIMELINE_MAX_SIZE])
+    sql, params = posts.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(post_id, pub_date, user_id) '
+            f'SELECT feed.*, %s FROM ({sql}) AS feed',
+            [user_id, *params])
+        return cursor.rowcount
@@ -23,9 +23,21 @@ urlpatterns = [
     path('posts/<int:post_id>/',
          views.post_detail,
          name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
+    path('media/resize/<int:post_id>/<int:width>x<int:height>/',
+         views.resized_image,
+         name='resized_image'),
+    path('search/',
+         views.search,
+         name='search'),
+    path('export/',
+         views.export,
+         name='export'),
     path('follow/',
          views.follow_index,
          name='follow_index'),
@@ -1,45 +1,89 @@
 
 from django.shortcuts import get_object_or_404
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.http import FileResponse
+from django.http import Http404
+from django.http import HttpResponseBadRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import redirect
 from django.shortcuts import render
-from django.core.paginator import Paginator
-from django.views.decorators.cache import cache_page
 
+from core import writes
+from core.replicas import use_primary
+from posts import caching
+from posts import conditions
+from posts import exporter
+from posts import images
+from posts import resize
+from posts import thumbnails
 from posts.forms import CommentForm
 from posts.forms import PostForm
+from posts.models import Comment
 from posts.models import Follow
 from posts.models import Group
 from posts.models import Post
 from posts.models import User
+from posts.paginators import KeysetPaginator
+from posts.search import SearchResults
+from posts.settings import COMMENTS_PER_PAGE
 from posts.settings import POSTS_PER_PAGE
+from posts.settings import RESIZE_SIZES
+
+
+def get_page(request, posts, key_field='pub_date', **options):
+    paginator = KeysetPaginator(posts, POSTS_PER_PAGE, key_field, **options)
+    return paginator.get_page(request.GET)
+
+
+def get_comments_page(request, post_id):
+    comments = Comment.objects.filter(
+        post_id=post_id).select_related('author')
+    paginator = KeysetPaginator(comments, COMMENTS_PER_PAGE, 'created')
+    return paginator.get_page(request.GET)
+
+
+def index_scopes():
+    return [caching.posts_scope()]
 
 
-def get_page(request, posts):
-    paginator = Paginator(posts, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def group_scopes(slug):
+    return [caching.group_scope(slug)]
 
 
-@cache_page(20)
+def profile_scopes(username):
+    return [caching.author_scope(username)]
+
+
+def post_scopes(post_id):
+    return [caching.post_scope(post_id)]
+
+
+@conditions.conditional_page(index_scopes)
+@caching.cache_by_generation(index_scopes)
 def index(request):
     return render(request, 'posts/index.html', context={
-        'page_obj': get_page(request, Post.objects.all()),
+        'page_obj': get_page(request, Post.objects.for_feed()),
     })
 
 
+@conditions.conditional_page(group_scopes)
+@caching.cache_by_generation(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', context={
-        'page_obj': get_page(request, group.posts.all()),
+        'page_obj': get_page(request, group.posts.for_feed()),
         'group': group
     })
 
 
+@conditions.conditional_page(profile_scopes)
+@caching.cache_by_generation(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.all()
-    page_obj = get_page(request, posts)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    page_obj = get_page(request, author.posts.for_feed())
     following = (request.user.is_authenticated
                  and request.user != author
                  and Follow.objects.filter(
@@ -53,26 +97,91 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@conditions.conditional_page(post_scopes)
+@caching.cache_by_generation(post_scopes, vary_on_csrf=True)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.for_feed(), id=post_id)
     form = CommentForm(request.POST or None)
-    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'form': form,
-        'comments': comments
+        'comments': get_comments_page(request, post.id)
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@caching.cache_by_generation(post_scopes)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), id=post_id)
+    return render(request, 'posts/includes/comment_list.html', context={
+        'post': post,
+        'comments': get_comments_page(request, post.id)
+    })
+
+
+def resized_image(request, post_id, width, height):
+    if (width, height) not in RESIZE_SIZES:
+        raise Http404('Такого размера нет')
+    image = get_object_or_404(
+        Post.objects.exclude(image='').values_list('image', flat=True),
+        id=post_id)
+    try:
+        file = resize.open_resized(image, width, height)
+    except OSError:
+        raise Http404('Картинка недоступна')
+    response = FileResponse(file)
+    if request.GET.get('v') == resize.version(image):
+        # Метка в URL меняется вместе с картинкой поста.
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    else:
+        response['Cache-Control'] = 'public, max-age=3600'
+    return response
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(SearchResults(query), POSTS_PER_PAGE)
+    return render(request, 'posts/search.html', context={
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    })
+
+
+@staff_member_required
+def export(request):
+    kinds = request.GET.getlist('kind')
+    fmt = request.GET.get('format', 'jsonl')
+    gzip = request.GET.get('gzip', '').lower() in ('1', 'true', 'yes')
+    try:
+        chunks = exporter.stream(kinds, fmt, gzip)
+    except exporter.ExportError as error:
+        return HttpResponseBadRequest(str(error))
+    response = StreamingHttpResponse(
+        chunks,
+        content_type='application/gzip' if gzip else exporter.FORMATS[fmt])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{exporter.filename(kinds, fmt, gzip)}"')
+    return response
+
+
+def save_post(operation, form):
+    """Сохраняет пост формы; картинка не переживает откат записи."""
+    try:
+        return writes.run(operation, form.save)
+    except Exception:
+        if form.created_image:
+            images.discard(form.created_image)
+        raise
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, request.FILES or None)
     if not form.is_valid():
         return render(request, 'posts/create_post.html', {'form': form})
-    post = form.save(commit=False)
-    post.author = request.user
-    post.save()
+    form.instance.author = request.user
+    post = save_post('post_create', form)
+    thumbnails.queue(post)
     return redirect('posts:profile', username=post.author.username)
 
 
@@ -95,7 +204,7 @@ def post_edit(request, post_id):
             'is_edit': True
         }
         return render(request, 'posts/create_post.html', context)
-    form.save()
+    thumbnails.queue(save_post('post_edit', form))
     return redirect(
         'posts:post_detail',
         post_id=post.id
@@ -110,33 +219,41 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        writes.submit('add_comment', comment.save)
     return redirect('posts:post_detail', post_id=post.id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(
-        author__following__user=request.user)
     return render(request, 'posts/follow.html', context={
-        'page_obj': get_page(request, post_list)
+        'page_obj': get_page(
+            request, Post.objects.for_feed(), 'timeline_entries__pub_date',
+            pk_field='timeline_entries__post',
+            filters={'timeline_entries__user': request.user}),
     })
 
 
 @login_required
+@use_primary
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    if (
-        author != user
-        and not Follow.objects.filter(author=author, user=user).exists()
-    ):
-        Follow.objects.create(user=user, author=author)
+
+    def follow():
+        if (
+            author != user
+            and not Follow.objects.filter(author=author, user=user).exists()
+        ):
+            Follow.objects.create(user=user, author=author)
+
+    writes.submit('profile_follow', follow)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@use_primary
 def profile_unfollow(request, username):
     user = request.user
-    Follow.objects.filter(author__username=username, user=user).delete()
+    writes.submit('profile_unfollow', Follow.objects.filter(
+        author__username=username, user=user).delete)
     return redirect('posts:profile', username=username)
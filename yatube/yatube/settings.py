@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.performance.PerformanceMiddleware',
+    'core.slowqueries.SlowQueryMiddleware',
+    'core.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,7 +63,8 @@ TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates с замером времени отрисовки (core.performance)
+        'BACKEND': 'core.performance.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -86,9 +90,46 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение переживает запрос (секунды) вместе со своими прагмами
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# реплики только для чтения (core.replicas) — алиасы из DATABASES; GET-запросы
+# читают с них, запись и чтение после своей записи — из default. Локально
+# реплика — копия файла, её обновляет manage.py sync_replicas:
+# DATABASES['replica'] = {**DATABASES['default'],
+#                         'NAME': os.path.join(BASE_DIR, 'replica.sqlite3'),
+#                         'PRAGMAS': {'query_only': 1},
+#                         'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+# на сколько секунд реплика может отставать: столько клиент после записи
+# читает из default, и столько не кэшируются прочитанные с реплики страницы
+REPLICA_LAG_SECONDS = 5
+
+# прагмы каждого нового соединения с SQLite (core.sqlite); словарь PRAGMAS
+# в настройках отдельной базы дополняет и переопределяет этот
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# запись из view (core.writes): сколько раз повторять BEGIN IMMEDIATE, если
+# блокировку не дали за busy_timeout, и первая пауза перед повтором в
+# секундах (случайная от нуля, удваивается с каждой попыткой)
+WRITE_RETRIES = 3
+WRITE_RETRY_DELAY = 0.05
+# сколько секунд ждать соседние мелкие записи (комментарии, подписки), чтобы
+# зафиксировать их одной транзакцией, и сколько записей в пачке самое большее;
+# нужно только воркерам с потоками (gunicorn --threads), None — не ждать
+WRITE_BATCH_WINDOW = None
+WRITE_BATCH_SIZE = 50
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -137,6 +178,14 @@ LOGIN_REDIRECT_URL = 'posts:index'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# кто отдаёт тело медиафайлов: None — сам Django, 'x-accel-redirect' —
+# nginx (internal location с префиксом ниже), 'x-sendfile' — Apache/lighttpd
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
+
+# тесты переносят служебные файлы (SQLite, кэш картинок, загрузки) во
+# временный каталог (core.testing)
+TEST_RUNNER = 'core.testing.TemporaryFilesRunner'
 
 # подключаем движок filebased.EmailBackend
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
@@ -146,9 +195,35 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 # имя view-функции, обрабатывающей ошибку 403
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
+# метаданные миниатюр sorl — в общем для всех процессов файле SQLite
+THUMBNAIL_KVSTORE = 'posts.kvstore.SQLiteKVStore'
+THUMBNAIL_KVSTORE_PATH = os.path.join(BASE_DIR, 'thumbnails.sqlite3')
+
+# доля запросов, для которых считаются SQL, кэш и время шаблонов:
+# результат — заголовок Server-Timing и строка INFO в логгере core.performance
+PERFORMANCE_SAMPLE_RATE = 0.05
+
+# метрики Prometheus (/metrics): общий для процессов файл и токен, с которым
+# их отдавать (заголовок Authorization: Bearer <токен>); без токена /metrics
+# закрыт
+METRICS_ENABLED = True
+METRICS_PATH = os.path.join(BASE_DIR, 'metrics.sqlite3')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# журнал SQL-запросов дольше SLOW_QUERY_MS мс (None — выключен),
+# сводка — manage.py slowqueries
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG_PATH = os.path.join(BASE_DIR, 'slow_queries.sqlite3')
+
+# дисковый кэш уменьшенных картинок (/media/resize/)
+RESIZE_CACHE_ROOT = os.path.join(BASE_DIR, 'resize_cache')
+
 # подключение кэширования
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+# поколения кэша страниц (posts.caching) — в общем для всех процессов файле
+# SQLite: кэш у каждого процесса свой, а сброс должны видеть все
+CACHE_GENERATIONS_PATH = os.path.join(BASE_DIR, 'cache_generations.sqlite3')